@@ -1,26 +1,35 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from flask_cors import CORS
-from deepgram import Deepgram
 from elevenlabs import ElevenLabs
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 from waitress import serve
-import logging, time, os, io
-from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
-import requests
+import logging, time, os, io, json, queue, threading, zipfile, contextvars, itertools
+from urllib.parse import quote
+from concurrent.futures import wait, as_completed, FIRST_COMPLETED
+import metrics
+import upstream
+from scheduler import (
+    AdmissionGate, Scheduler, ProviderLimiter, Rejected, Overloaded, DeadlineExceeded, set_request_policy, request_policy,
+    capped_timeout, remaining, until_deadline, wait_result
+)
+from audio_preprocessing import prepare_audio, passthrough, stitch
+from tts_cache import AudioCache
+from llm_cache import ResponseCache, create_backend
+from text_chunking import sentence_segments, SentenceBuffer, chunk_by_tokens, join_chunks, token_counter
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app, origins=[
+CORS_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
     "https://voice-ai-agent-phi.vercel.app",
     "https://voice-ai-agent.onrender.com"
-])
+]
+CORS(app, origins=CORS_ORIGINS)
 # Configure Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,16 +48,38 @@ if not all([DEEPGRAM_API_KEY, ELEVENLABS_API_KEY, OPENAI_API_KEY]):
 
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-dg_client = Deepgram(DEEPGRAM_API_KEY)
-el_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+# Provider SDKs share the pooled, keep-alive HTTP clients from upstream.py
+el_client = ElevenLabs(
+    api_key=ELEVENLABS_API_KEY,
+    base_url=upstream.ELEVENLABS_BASE_URL,
+    httpx_client=upstream.http_client('elevenlabs')
+)
 
 # Initialize LangChain LLM with optimized settings
-llm = ChatOpenAI(
-    temperature=0.7,
-    model_name="gpt-3.5-turbo",
-    max_tokens=1000,
-    request_timeout=30
-)
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_REQUEST_TIMEOUT = 30
+
+def create_llm(**overrides):
+    return ChatOpenAI(
+        temperature=0.7,
+        model_name=LLM_MODEL,
+        max_tokens=1000,
+        request_timeout=LLM_REQUEST_TIMEOUT,
+        base_url=upstream.OPENAI_BASE_URL,
+        http_client=upstream.http_client('openai'),
+        http_async_client=upstream.async_http_client('openai'),
+        **overrides
+    )
+
+llm = create_llm()
+# Requests with a deadline have no time for SDK retries, and each call's timeout is capped by it
+deadline_llm = create_llm(max_retries=0)
+
+def request_llm():
+    """The LLM to call for the current request."""
+    if remaining() is None:
+        return llm
+    return deadline_llm.bind(timeout=capped_timeout(LLM_REQUEST_TIMEOUT))
 
 # Supported languages with their display names and flags
 SUPPORTED_LANGUAGES = {
@@ -77,18 +108,396 @@ VOICE_MAP = {
     }
 }
 
-# Thread pool for concurrent processing
-executor = ThreadPoolExecutor(max_workers=10)
+# Batch items get their own pool: an item may fan out onto a provider pool and wait on it,
+# which would deadlock if the items themselves occupied every worker of that pool
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+batch_executor = metrics.TracedExecutor(int(os.getenv("BATCH_MAX_WORKERS", 16)), 'batch')
+
+# Request threads of the WSGI server (waitress, or a2wsgi in ASGI mode). Only MAX_ACTIVE_REQUESTS
+# requests are worked on at once; the rest get a fast 429 and the spare threads keep /health responsive
+SERVER_THREADS = int(os.getenv("WSGI_THREADS", 16))
+MAX_ACTIVE_REQUESTS = int(os.getenv("MAX_ACTIVE_REQUESTS", max(1, SERVER_THREADS - 2)))
+
+# Admission control for upstream calls, shared by all endpoints: per-provider concurrency, optional
+# rate limits (OpenAI in tokens/s, ElevenLabs in characters/s; 0 disables) and bounded priority queues.
+# The native ASGI routes never pass the admission gate, so the interactive queue is sized from the
+# provider's own concurrency: about as many callers as its slots can serve within the queue timeout
+PROVIDER_QUEUE_PER_SLOT = int(os.getenv("PROVIDER_QUEUE_PER_SLOT", 8))
+PROVIDER_MAX_QUEUE = os.getenv("PROVIDER_MAX_QUEUE")
+PROVIDER_MAX_BATCH_QUEUE = int(os.getenv("PROVIDER_MAX_BATCH_QUEUE", 256))
+PROVIDER_QUEUE_TIMEOUT = float(os.getenv("PROVIDER_QUEUE_TIMEOUT", 15))
+
+def provider_limiter(name, concurrency, rate=0):
+    max_queue = {
+        'interactive': int(PROVIDER_MAX_QUEUE) if PROVIDER_MAX_QUEUE else concurrency * PROVIDER_QUEUE_PER_SLOT,
+        'batch': PROVIDER_MAX_BATCH_QUEUE
+    }
+    return ProviderLimiter(name, concurrency, rate=rate, max_queue=max_queue, queue_timeout=PROVIDER_QUEUE_TIMEOUT)
+
+scheduler = Scheduler([
+    provider_limiter('openai', int(os.getenv("OPENAI_MAX_CONCURRENCY", 8)), float(os.getenv("OPENAI_TOKENS_PER_SECOND", 0))),
+    provider_limiter('elevenlabs', int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", 4)), float(os.getenv("ELEVENLABS_CHARS_PER_SECOND", 0))),
+    provider_limiter('deepgram', int(os.getenv("DEEPGRAM_MAX_CONCURRENCY", 8))),
+    provider_limiter('n8n', int(os.getenv("N8N_MAX_CONCURRENCY", 4))),
+    # Live transcription sessions (ASGI WebSocket) hold a slot for as long as they stay open, so
+    # they get their own limit instead of starving prerecorded uploads
+    provider_limiter('deepgram_live', int(os.getenv("DEEPGRAM_LIVE_MAX_SESSIONS", 8)))
+])
+provider_slot = scheduler.slot
+
+# Fan-out work (STT segments, TTS segments, LLM chunks) runs on one pool per provider, sized to its
+# concurrency limit. Workers waiting for a slot then only hold up calls to the same provider, and
+# that wait is visible to the scheduler rather than hidden in a shared pool's queue
+provider_pools = {name: metrics.TracedExecutor(scheduler.concurrency(name), name) for name in upstream.PROVIDERS}
+thread_pools = [*provider_pools.values(), batch_executor]
+
+metrics.registry.register(metrics.CallbackGauge(
+    "nexus_executor_tasks", "Tasks on the thread pools by state.", ("pool", "state"),
+    lambda: {
+        (pool.name, state): count
+        for pool in thread_pools for state, count in pool.stats().items() if state != 'max_workers'
+    }
+))
+
+# Long inputs are chunked; summaries are map-reduced, other types are processed per chunk in order.
+# Non-summary chunks stay well under max_tokens because their output is about as long as the input.
+count_tokens = token_counter(LLM_MODEL)
+PROCESS_SUMMARY_CHUNK_TOKENS = int(os.getenv("PROCESS_SUMMARY_CHUNK_TOKENS", 3000))
+PROCESS_CHUNK_TOKENS = int(os.getenv("PROCESS_CHUNK_TOKENS", 700))
+PROCESS_CHUNK_OVERLAP = int(os.getenv("PROCESS_CHUNK_OVERLAP", 100))
+PROCESS_MAX_CONCURRENCY = int(os.getenv("PROCESS_MAX_CONCURRENCY", 4))
+
+# LLM completions are cached on a normalized prompt hash; identical in-flight prompts share one call
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+llm_cache = ResponseCache(
+    create_backend(
+        os.getenv("LLM_CACHE_BACKEND", "tiered"),
+        os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3")),
+        int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000)),
+        LLM_CACHE_TTL
+    ),
+    ttl=LLM_CACHE_TTL
+)
+
+def iter_concurrent(fn, items, limit, pool):
+    """Runs fn over items on the pool with at most `limit` in flight, yielding results in input order."""
+    items = list(items)
+    futures = {}
+    next_index = 0
+    try:
+        for index in range(len(items)):
+            while next_index < len(items) and len(futures) < limit:
+                futures[next_index] = pool.submit(fn, items[next_index])
+                next_index += 1
+            future = futures[index]
+            while not future.done():
+                # Finished-but-not-yielded futures would make wait() return at once and spin
+                wait([f for f in futures.values() if not f.done()], return_when=FIRST_COMPLETED)
+                # Keep the window full while the head of the line is still running
+                while next_index < len(items) and sum(not f.done() for f in futures.values()) < limit:
+                    futures[next_index] = pool.submit(fn, items[next_index])
+                    next_index += 1
+            del futures[index]
+            yield future.result()
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+def map_concurrent(fn, items, limit, pool):
+    return list(iter_concurrent(fn, items, limit, pool))
+
+def iter_completed(fn, items, pool=batch_executor):
+    """Runs fn over items on the pool and yields (item, result, error) as each one finishes."""
+    futures = {pool.submit(fn, item): item for item in items}
+    try:
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
+    finally:
+        for future in futures:
+            future.cancel()
+
+TTS_MODEL = "eleven_multilingual_v2"
+
+# Persistent audio cache, content-addressed on (text, voice, model)
+tts_cache = AudioCache(
+    directory=os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache")),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+    hot_max_bytes=int(os.getenv("TTS_CACHE_HOT_BYTES", 32 * 1024 * 1024)),
+    # Callers sharing an identical in-flight synthesis stop waiting at their own deadline
+    wait_shared=wait_result
+)
+
+def synthesize(text, voice_id):
+    with provider_slot('elevenlabs', len(text)):
+        return b''.join(until_deadline(el_client.text_to_speech.convert(
+            voice_id,
+            text=text,
+            model_id=TTS_MODEL,
+            request_options=upstream.elevenlabs_request_options()
+        ), 'elevenlabs'))
 
-# Cache for frequently used responses
-@lru_cache(maxsize=100)
 def get_cached_tts(text, voice_id):
-    return el_client.generate(
-        text=text,
-        voice={"id": voice_id},
-        model="eleven_multilingual_v2"
+    key = AudioCache.make_key(text, voice_id, TTS_MODEL)
+    return tts_cache.get_or_create(key, lambda: synthesize(text, voice_id))
+
+def tts_file_response(entry):
+    # Hot entries come from memory, the rest are streamed straight from disk
+    return send_file(
+        io.BytesIO(entry.data) if entry.data is not None else entry.path,
+        mimetype="audio/mpeg",
+        as_attachment=True,
+        download_name="nexusvoice_audio.mp3",
+        etag=entry.key,
+        conditional=True,
+        max_age=86400
+    )
+
+# Streaming TTS: segment size and how many segments are synthesized ahead
+TTS_STREAM_SEGMENT_CHARS = int(os.getenv("TTS_STREAM_SEGMENT_CHARS", 250))
+TTS_STREAM_LOOKAHEAD = int(os.getenv("TTS_STREAM_LOOKAHEAD", 3))
+
+_SEGMENT_DONE = object()
+
+def _synthesize_segment(text, voice_id, chunks, cancelled):
+    try:
+        # The client may be gone by the time a queued segment gets a worker or a slot; don't start a paid call
+        if cancelled.is_set():
+            return
+        with provider_slot('elevenlabs', len(text)):
+            if cancelled.is_set():
+                return
+            audio = until_deadline(el_client.text_to_speech.convert(
+                voice_id, text=text, model_id=TTS_MODEL, request_options=upstream.elevenlabs_request_options()
+            ), 'elevenlabs')
+            try:
+                for chunk in audio:
+                    if cancelled.is_set():
+                        break
+                    if chunk:
+                        chunks.put(chunk)
+            finally:
+                audio.close()
+    except Exception as e:
+        chunks.put(e)
+    finally:
+        chunks.put(_SEGMENT_DONE)
+
+def stream_tts_segments(segments, voice_id):
+    """Synthesizes segments concurrently on the ElevenLabs pool and yields audio chunks in segment order.
+
+    Segments may be a lazy iterator (e.g. sentences coming out of the LLM); it is
+    consumed on a feeder thread so waiting for the next segment never holds back
+    audio that is already available.
+    """
+    cancelled = threading.Event()
+    pending = queue.Queue()
+    slots = threading.Semaphore(TTS_STREAM_LOOKAHEAD)
+    futures = []
+
+    def feed():
+        try:
+            for segment in segments:
+                while not slots.acquire(timeout=0.25):
+                    if cancelled.is_set():
+                        return
+                if cancelled.is_set():
+                    return
+                chunks = queue.Queue()
+                futures.append(provider_pools['elevenlabs'].submit(_synthesize_segment, segment, voice_id, chunks, cancelled))
+                pending.put(chunks)
+        except Exception as e:
+            pending.put(e)
+        finally:
+            if hasattr(segments, 'close'):
+                segments.close()
+            pending.put(_SEGMENT_DONE)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(feed,), name="tts-feeder", daemon=True).start()
+    try:
+        while True:
+            chunks = pending.get()
+            if chunks is _SEGMENT_DONE:
+                break
+            if isinstance(chunks, Exception):
+                raise chunks
+            try:
+                while True:
+                    chunk = chunks.get()
+                    if chunk is _SEGMENT_DONE:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            finally:
+                slots.release()
+    finally:
+        # Stops in-flight segments when the client goes away or a segment fails; queued ones never start
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+
+def audio_stream_response(audio_stream, cache_key=None, headers=None):
+    # Pull the first chunk before committing to a 200 so upstream errors still map to a JSON error
+    first_chunk = next(audio_stream, None)
+    if first_chunk is None:
+        return None
+
+    def generate():
+        writer = tts_cache.writer(cache_key) if cache_key else None
+        completed = False
+        try:
+            for chunk in _prepend(first_chunk, audio_stream):
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+            completed = True
+        except Exception as e:
+            logger.error(f"Audio stream failed: {str(e)}")
+        finally:
+            audio_stream.close()
+            if writer is not None:
+                if completed:
+                    writer.commit()
+                else:
+                    writer.abort()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="audio/mpeg",
+        headers={
+            'Content-Disposition': 'attachment; filename=nexusvoice_audio.mp3',
+            'X-Accel-Buffering': 'no',
+            **(headers or {})
+        }
     )
 
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+# ---------------- Prompts & Transcription ----------------
+PROMPT_TEMPLATES = {
+    'summarize': "Summarize the following text in {language}:\n\n{text}",
+    'translate': "Translate the following text to {language}:\n\n{text}",
+    'respond': "You are Nexus, a helpful voice assistant. Reply conversationally and concisely in {language} to the following:\n\n{text}",
+}
+# Fallback for 'enhance' and other types
+DEFAULT_PROMPT_TEMPLATE = "Process the following text in {language}:\n\n{text}"
+
+def build_prompt(processing_type, language, text):
+    template = PROMPT_TEMPLATES.get(processing_type, DEFAULT_PROMPT_TEMPLATE)
+    return template.format(language=SUPPORTED_LANGUAGES[language]['name'], text=text)
+
+REDUCE_PROMPT_TEMPLATE = "Combine the following partial summaries of one long text into a single coherent summary in {language}:\n\n{text}"
+
+def build_reduce_prompt(language, partials):
+    return REDUCE_PROMPT_TEMPLATE.format(language=SUPPORTED_LANGUAGES[language]['name'], text=partials)
+
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+
+def transcribe_segment(segment, language):
+    with provider_slot('deepgram'):
+        return upstream.transcribe(DEEPGRAM_API_KEY, segment.data, language, segment.mimetype)
+
+def transcribe_audio(audio_data, language):
+    """Returns (transcript, confidence, words) with word times in the original recording, or None."""
+    segments = prepare_audio(audio_data) if AUDIO_PREPROCESS else passthrough(audio_data)
+    alternatives = map_concurrent(
+        lambda segment: transcribe_segment(segment, language), segments, scheduler.concurrency('deepgram'),
+        provider_pools['deepgram']
+    )
+    return stitch(segments, alternatives)
+
+# ---------------- Request Tracing ----------------
+# Clients send this header to get a Server-Timing breakdown of the request's stages
+TRACE_HEADER = "X-Nexus-Trace"
+UNTRACED_ENDPOINTS = {None, 'static', 'health_check', 'prometheus_metrics', 'debug_profile'}
+
+def _count_bytes(body, sent):
+    try:
+        for chunk in body:
+            sent[0] += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+@app.before_request
+def start_request_trace():
+    # Server threads are reused, so untraced requests clear the previous request's trace.
+    # Streamed bodies run after teardown and still see the trace set here.
+    if request.endpoint in UNTRACED_ENDPOINTS:
+        metrics.clear_trace()
+    else:
+        g.trace = metrics.start_trace(request.endpoint)
+
+def call_on_close(response, fn):
+    """response.call_on_close(fn); for send_file responses fn runs right away."""
+    # werkzeug hands direct-passthrough bodies to the server as they are (e.g. as its file wrapper) and
+    # never closes the response. Their size is already known and no app code runs while they are sent
+    if response.direct_passthrough:
+        fn()
+    else:
+        response.call_on_close(fn)
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace is None:
+        return response
+
+    if request.headers.get(TRACE_HEADER) and 'Server-Timing' not in response.headers:
+        # Streamed responses only include the stages finished before the first byte
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers['Access-Control-Expose-Headers'] = 'Server-Timing'
+
+    sent = [response.content_length or 0]
+    if response.is_streamed and response.content_length is None:
+        response.response = _count_bytes(response.response, sent)
+    bytes_in = request.content_length
+    status = response.status_code
+    # Runs once the body has been sent, so streamed responses are timed to their last byte
+    call_on_close(response, lambda: metrics.finish_trace(trace, status, bytes_in, sent[0]))
+    return response
+
+# ---------------- Admission Control ----------------
+# Batch endpoints queue behind interactive traffic; any client may also opt into the batch class
+BATCH_ENDPOINTS = {'process_batch', 'text_to_speech_batch'}
+
+admission = AdmissionGate('server', MAX_ACTIVE_REQUESTS)
+
+@app.before_request
+def apply_request_policy():
+    default_priority = 'batch' if request.endpoint in BATCH_ENDPOINTS else 'interactive'
+    set_request_policy(*request_policy(request.headers, default_priority))
+    # Health, metrics and profiling are never refused
+    if request.endpoint not in UNTRACED_ENDPOINTS:
+        g.admitted_at = admission.enter()
+
+@app.after_request
+def release_admission(response):
+    entered = g.pop('admitted_at', None)
+    if entered is not None:
+        # Streamed bodies keep their server thread until the response is closed
+        call_on_close(response, lambda: admission.leave(entered))
+    return response
+
+@app.teardown_request
+def release_unanswered_admission(_):
+    # Only set here when after_request never ran
+    entered = g.pop('admitted_at', None)
+    if entered is not None:
+        admission.leave(entered)
+
+@app.errorhandler(Overloaded)
+def provider_overloaded(e):
+    return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({'error': str(e)}), 504
+
 # ---------------- Health Check Endpoint ----------------
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -96,12 +505,50 @@ def health_check():
         'status': 'healthy',
         'service': 'Nexus Voice AI',
         'version': '1.0.0',
-        'supported_languages': SUPPORTED_LANGUAGES
+        'supported_languages': SUPPORTED_LANGUAGES,
+        'tts_cache': tts_cache.stats(),
+        'llm_cache': llm_cache.stats(),
+        'saturation': {
+            'in_flight_requests': metrics.IN_FLIGHT.value(),
+            'admission': admission.stats(),
+            'executors': {pool.name: pool.stats() for pool in thread_pools},
+            'providers': scheduler.stats(),
+            'upstream_connections': upstream.pool_stats()
+        }
     })
 
+# ---------------- Metrics & Profiling ----------------
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED") == "1"
+PROFILE_MAX_SECONDS = 60
+PROFILE_MIN_INTERVAL_MS = 1
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Samples all threads for ?seconds= and returns collapsed stacks for a flame graph."""
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler is disabled'}), 404
+
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), PROFILE_MAX_SECONDS)
+        interval_ms = float(request.args.get('interval_ms', 10))
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not 0 < interval_ms < float('inf'):
+        return jsonify({'error': 'interval_ms must be a positive number'}), 400
+
+    # Shorter intervals would busy-sample every thread stack
+    stacks = metrics.profile(seconds, max(interval_ms, PROFILE_MIN_INTERVAL_MS) / 1000)
+    if stacks is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    return Response(stacks, mimetype='text/plain')
+
 # ---------------- Speech to Text Endpoint ----------------
 @app.route('/api/stt', methods=['POST'])
-async def speech_to_text():
+def speech_to_text():
     if 'file' not in request.files:
         return jsonify({'error': 'No audio file provided'}), 400
 
@@ -115,33 +562,23 @@ async def speech_to_text():
         }), 400
 
     try:
-        audio_data = audio_file.read()
-        response = await dg_client.transcription.prerecorded(
-            {"buffer": audio_data, "mimetype": "audio/wav"},
-            {
-                "punctuate": True,
-                "language": language,
-                "model": "nova-2",
-                "smart_format": True,
-                "diarize": True
-            }
-        )
-        
-        if "results" in response and "channels" in response["results"]:
-            transcript = response["results"]["channels"][0]["alternatives"][0]["transcript"]
-            confidence = response["results"]["channels"][0]["alternatives"][0]["confidence"]
-            
-            return jsonify({
-                'text': transcript,
-                'confidence': confidence,
-                'language': language,
-                'language_name': SUPPORTED_LANGUAGES[language]['name'],
-                'language_flag': SUPPORTED_LANGUAGES[language]['flag']
-            })
-        else:
-            logger.error(f"Transcription response format is incorrect: {response}")
+        result = transcribe_audio(audio_file.read(), language)
+
+        if result is None:
             return jsonify({'error': 'Transcription failed'}), 500
 
+        transcript, confidence, words = result
+        return jsonify({
+            'text': transcript,
+            'confidence': confidence,
+            'words': words,
+            'language': language,
+            'language_name': SUPPORTED_LANGUAGES[language]['name'],
+            'language_flag': SUPPORTED_LANGUAGES[language]['flag']
+        })
+
+    except Rejected:
+        raise
     except Exception as e:
         logger.error(f"Error processing speech-to-text: {str(e)}")
         return jsonify({'error': 'Speech-to-text conversion failed'}), 500
@@ -158,24 +595,223 @@ def text_to_speech():
         return jsonify({'error': 'No text provided'}), 400
 
     try:
-        audio_generator = get_cached_tts(text, voice_id)
-        audio_data = b''.join(audio_generator)
+        if request.args.get('stream') in ('1', 'true'):
+            key = AudioCache.make_key(text, voice_id, TTS_MODEL)
+            entry = tts_cache.get(key)
+            if entry is not None:
+                return tts_file_response(entry)
+            segments = sentence_segments(text, TTS_STREAM_SEGMENT_CHARS)
+            response = audio_stream_response(stream_tts_segments(segments, voice_id), cache_key=key)
+            if response is None:
+                return jsonify({'error': 'Failed to generate audio'}), 500
+            return response
 
-        if not audio_data:
+        entry = get_cached_tts(text, voice_id)
+
+        if entry is None:
             return jsonify({'error': 'Failed to generate audio'}), 500
 
-        return Response(
-            io.BytesIO(audio_data),
-            mimetype="audio/mpeg",
-            headers={
-                'Content-Disposition': 'attachment; filename=nexusvoice_audio.mp3'
-            }
-        )
+        response = tts_file_response(entry)
+        response.headers['Content-Location'] = f"/api/tts/audio/{entry.key}"
+        return response
+    except Rejected:
+        raise
     except Exception as e:
         logger.error(f"Text-to-speech conversion failed: {str(e)}")
         return jsonify({'error': 'Text-to-speech conversion failed'}), 500
 
+# Cached audio is content-addressed, so GET by key is safe to cache and supports Range
+@app.route('/api/tts/audio/<key>', methods=['GET'])
+def cached_audio(key):
+    entry = tts_cache.get(key) if len(key) == 64 and key.isalnum() else None
+    if entry is None:
+        return jsonify({'error': 'Audio not found'}), 404
+    return tts_file_response(entry)
+
 # ---------------- Text Processing Endpoint ----------------
+def llm_cache_key(prompt):
+    return ResponseCache.make_key(LLM_MODEL, prompt)
+
+# Completion length isn't known up front, so rate limiting charges the prompt plus a typical reply
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", 250))
+
+def llm_cost(prompt):
+    return count_tokens(prompt) + LLM_COMPLETION_TOKENS_ESTIMATE
+
+def llm_invoke(prompt):
+    with provider_slot('openai', llm_cost(prompt)):
+        return request_llm().invoke(prompt).content
+
+def llm_complete(prompt):
+    return llm_cache.get_or_compute(llm_cache_key(prompt), lambda: llm_invoke(prompt))
+
+def summarize_partials(language, text):
+    """Map step: summarizes chunks concurrently until the partial summaries fit a single reduce prompt."""
+    chunks = chunk_by_tokens(text, PROCESS_SUMMARY_CHUNK_TOKENS, PROCESS_CHUNK_OVERLAP, count_tokens)
+    partials = map_concurrent(
+        lambda chunk: llm_complete(build_prompt('summarize', language, chunk.text)),
+        chunks, PROCESS_MAX_CONCURRENCY, provider_pools['openai']
+    )
+    combined = "\n\n".join(p.strip() for p in partials)
+    combined_tokens = count_tokens(combined)
+    while len(chunks) > 1 and combined_tokens > PROCESS_SUMMARY_CHUNK_TOKENS:
+        chunks = chunk_by_tokens(combined, PROCESS_SUMMARY_CHUNK_TOKENS, 0, count_tokens)
+        partials = map_concurrent(
+            lambda chunk: llm_complete(build_reduce_prompt(language, chunk.text)),
+            chunks, PROCESS_MAX_CONCURRENCY, provider_pools['openai']
+        )
+        reduced = "\n\n".join(p.strip() for p in partials)
+        reduced_tokens = count_tokens(reduced)
+        if reduced_tokens >= combined_tokens:
+            # Summaries stopped shrinking; let the final reduce work with what we have
+            break
+        combined, combined_tokens = reduced, reduced_tokens
+    return combined
+
+def process_chunks(processing_type, language, text):
+    chunks = chunk_by_tokens(text, PROCESS_CHUNK_TOKENS, 0, count_tokens)
+    outputs = iter_concurrent(
+        lambda chunk: llm_complete(build_prompt(processing_type, language, chunk.text)),
+        chunks, PROCESS_MAX_CONCURRENCY, provider_pools['openai']
+    )
+    return chunks, outputs
+
+def needs_chunking(processing_type, text):
+    limit = PROCESS_SUMMARY_CHUNK_TOKENS if processing_type == 'summarize' else PROCESS_CHUNK_TOKENS
+    return count_tokens(text) > limit
+
+def process_with_llm(processing_type, language, text):
+    if not needs_chunking(processing_type, text):
+        return llm_complete(build_prompt(processing_type, language, text))
+    if processing_type == 'summarize':
+        return llm_complete(build_reduce_prompt(language, summarize_partials(language, text)))
+    chunks, outputs = process_chunks(processing_type, language, text)
+    return join_chunks(chunks, list(outputs))
+
+def stream_with_llm(processing_type, language, text):
+    """Streaming counterpart of process_with_llm yielding text fragments."""
+    if not needs_chunking(processing_type, text):
+        prompt = build_prompt(processing_type, language, text)
+    elif processing_type == 'summarize':
+        # Only the final reduce is streamed
+        prompt = build_reduce_prompt(language, summarize_partials(language, text))
+    else:
+        chunks, outputs = process_chunks(processing_type, language, text)
+        try:
+            for i, output in enumerate(outputs):
+                yield (chunks[i - 1].separator if i else '') + output.strip()
+        finally:
+            outputs.close()
+        return
+
+    key = llm_cache_key(prompt)
+    cached = llm_cache.get(key) or llm_cache.wait_pending(key)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = until_deadline(request_llm().stream(prompt), 'openai')
+    parts = []
+    try:
+        with provider_slot('openai', llm_cost(prompt)):
+            for chunk in stream:
+                parts.append(chunk.content)
+                yield chunk.content
+        llm_cache.set(key, ''.join(parts))
+    finally:
+        # Closing the stream aborts the upstream completion request
+        stream.close()
+
+N8N_NOT_CONFIGURED = "n8n workflow is not configured. Please set the N8N_WEBHOOK_URL environment variable."
+
+def n8n_webhook_url():
+    url = os.getenv("N8N_WEBHOOK_URL")
+    if not url or url == "YOUR_N8N_WEBHOOK_URL_HERE":
+        logger.warning("N8N_WEBHOOK_URL is not set. Returning placeholder response.")
+        return None
+    return url
+
+def run_n8n_workflow(text, language, processing_type):
+    url = n8n_webhook_url()
+    if url is None:
+        return N8N_NOT_CONFIGURED
+
+    payload = {
+        "text": text,
+        "language": language,
+        "processing_type": processing_type
+    }
+    with provider_slot('n8n'):
+        response = upstream.http_client('n8n').post(url, json=payload, timeout=upstream.request_timeout())
+    response.raise_for_status()
+    return response.json().get("processed_text", "Error processing with n8n")
+
+def process_result(text, processed_text, language, processing_type):
+    return {
+        'original_text': text,
+        'processed_text': processed_text,
+        'language': language,
+        'language_name': SUPPORTED_LANGUAGES[language]['name'],
+        'language_flag': SUPPORTED_LANGUAGES[language]['flag'],
+        'processing_type': processing_type
+    }
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def rejected_event(e):
+    # Headers are already sent, so the status the plain endpoint would use travels in the event
+    return sse_event('error', {
+        'error': str(e),
+        'status': 429 if isinstance(e, Overloaded) else 504,
+        'retry_after': getattr(e, 'retry_after', None)
+    })
+
+def process_stream_response(text, language, processing_type):
+    def token_stream():
+        if processing_type == 'n8n':
+            # Webhooks don't stream; the whole result arrives as a single token
+            yield run_n8n_workflow(text, language, processing_type)
+            return
+        yield from stream_with_llm(processing_type, language, text)
+
+    started = time.perf_counter()
+    tokens = token_stream()
+    # Pull the first token, which waits for the provider slot, before committing to a 200 so
+    # overload and deadlines are still answered with 429 and 504
+    first = list(itertools.islice(tokens, 1))
+
+    def generate():
+        parts = []
+        completed = False
+        try:
+            for token in itertools.chain(first, tokens):
+                if token:
+                    parts.append(token)
+                    yield sse_event('token', {'text': token})
+            completed = True
+            result = process_result(text, ''.join(parts), language, processing_type)
+            result['elapsed_ms'] = round((time.perf_counter() - started) * 1000)
+            yield sse_event('done', result)
+        except Rejected as e:
+            yield rejected_event(e)
+        except Exception as e:
+            logger.error(f"Text processing stream failed: {str(e)}")
+            yield sse_event('error', {'error': f"Text processing failed: {str(e)}"})
+        finally:
+            if not completed:
+                logger.info(f"Text processing stream stopped after {len(parts)} chunks; cancelling upstream generation")
+            tokens.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/api/process', methods=['POST'])
 def process_text():
     data = request.json
@@ -193,51 +829,263 @@ def process_text():
         }), 400
 
     try:
+        if request.args.get('stream') in ('1', 'true'):
+            return process_stream_response(text, language, processing_type)
+
         # n8n workflow integration
         if processing_type == 'n8n':
-            n8n_webhook_url = os.getenv("N8N_WEBHOOK_URL")
-            if not n8n_webhook_url or n8n_webhook_url == "YOUR_N8N_WEBHOOK_URL_HERE":
-                logger.warning("N8N_WEBHOOK_URL is not set. Returning placeholder response.")
-                processed_text = "n8n workflow is not configured. Please set the N8N_WEBHOOK_URL environment variable."
+            processed_text = run_n8n_workflow(text, language, processing_type)
+        else:
+            processed_text = process_with_llm(processing_type, language, text)
+
+        return jsonify(process_result(text, processed_text, language, processing_type))
+
+    except Rejected:
+        raise
+    except Exception as e:
+        logger.error(f"Text processing failed: {str(e)}")
+        return jsonify({'error': f"Text processing failed: {str(e)}"}), 500
+
+# ---------------- Batch Endpoints ----------------
+class _ZipStream(io.RawIOBase):
+    """Write-only, non-seekable sink that lets zipfile emit an archive incrementally."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def parse_batch_items(data):
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': 'No items provided'}), 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, (jsonify({'error': f"Batch exceeds {BATCH_MAX_ITEMS} items"}), 413)
+    return items, None
+
+def validate_batch_item(item, defaults):
+    if not isinstance(item, dict):
+        return None, 'Item must be an object'
+    item = {**defaults, **item}
+    text = str(item.get('text', '')).strip()
+    language = item.get('language', 'en')
+    if not text:
+        return None, 'No text provided'
+    # Anything else would crash the language lookup or the cache key below
+    for field in ('language', 'type', 'voice_id'):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            return None, f"{field} must be a string"
+    if language not in SUPPORTED_LANGUAGES:
+        return None, 'Unsupported language'
+    return {**item, 'text': text, 'language': language}, None
+
+@app.route('/api/process/batch', methods=['POST'])
+def process_batch():
+    data = request.json
+    items, error_response = parse_batch_items(data)
+    if error_response:
+        return error_response
+
+    started = time.perf_counter()
+    defaults = {'language': data.get('language', 'en'), 'type': data.get('type', 'summarize')}
+    results = [None] * len(items)
+    # Identical items are processed once and fanned back out to every index
+    unique = {}
+    for index, raw in enumerate(items):
+        item, error = validate_batch_item(raw, defaults)
+        if error:
+            results[index] = {'index': index, 'error': error}
+            continue
+        key = ResponseCache.make_key(item['type'], item['language'], item['text'])
+        unique.setdefault(key, (item, []))[1].append(index)
+
+    def run(key):
+        item = unique[key][0]
+        if item['type'] == 'n8n':
+            return run_n8n_workflow(item['text'], item['language'], item['type'])
+        return process_with_llm(item['type'], item['language'], item['text'])
+
+    for key, processed_text, error in iter_completed(run, list(unique)):
+        item, indexes = unique[key]
+        if error:
+            logger.error(f"Batch text processing failed: {str(error)}")
+        for index in indexes:
+            if error:
+                results[index] = {'index': index, 'error': f"Text processing failed: {str(error)}"}
             else:
-                payload = {
-                    "text": text,
-                    "language": language,
-                    "processing_type": processing_type
-                }
-                response = requests.post(n8n_webhook_url, json=payload)
-                response.raise_for_status()
-                processed_text = response.json().get("processed_text", "Error processing with n8n")
-
-        # Process text based on type
-        elif processing_type == 'summarize':
-            prompt = f"Summarize the following text in {SUPPORTED_LANGUAGES[language]['name']}:\n\n{text}"
-            response = llm.invoke(prompt)
-            processed_text = response.content
-        elif processing_type == 'translate':
-            prompt = f"Translate the following text to {SUPPORTED_LANGUAGES[language]['name']}:\n\n{text}"
-            response = llm.invoke(prompt)
-            processed_text = response.content
-        else: # Fallback for 'enhance' and other types
-            prompt = f"Process the following text in {SUPPORTED_LANGUAGES[language]['name']}:\n\n{text}"
-            response = llm.invoke(prompt)
-            processed_text = response.content
+                results[index] = {'index': index, **process_result(item['text'], processed_text, item['language'], item['type'])}
+
+    return jsonify({
+        'results': results,
+        'unique_items': len(unique),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000)
+    })
+
+@app.route('/api/tts/batch', methods=['POST'])
+def text_to_speech_batch():
+    data = request.json
+    items, error_response = parse_batch_items(data)
+    if error_response:
+        return error_response
+
+    defaults = {'language': data.get('language', 'en')}
+    manifest = [None] * len(items)
+    unique = {}
+    for index, raw in enumerate(items):
+        item, error = validate_batch_item(raw, defaults)
+        if error:
+            manifest[index] = {'index': index, 'error': error}
+            continue
+        voice_id = item.get('voice_id') or VOICE_MAP['Alice'][item['language']]
+        key = AudioCache.make_key(item['text'], voice_id, TTS_MODEL)
+        unique.setdefault(key, ({'text': item['text'], 'voice_id': voice_id}, []))[1].append(index)
+
+    def run(key):
+        item = unique[key][0]
+        return get_cached_tts(item['text'], item['voice_id'])
+
+    def generate():
+        sink = _ZipStream()
+        # Audio is already compressed, so entries are stored as-is
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            for key, entry, error in iter_completed(run, list(unique)):
+                indexes = unique[key][1]
+                filename = f"{indexes[0]:04d}.mp3"
+                if entry is None and error is None:
+                    error = 'Failed to generate audio'
+                if error is None and entry.data is not None:
+                    archive.writestr(filename, entry.data)
+                elif error is None:
+                    try:
+                        archive.write(entry.path, filename)
+                    except OSError as e:
+                        # The file may have been evicted since the entry was produced
+                        error = e
+                if error:
+                    logger.error(f"Batch text-to-speech failed: {str(error)}")
+                for index in indexes:
+                    if error:
+                        manifest[index] = {'index': index, 'error': f"Text-to-speech conversion failed: {str(error)}"}
+                    else:
+                        manifest[index] = {'index': index, 'file': filename}
+                yield from sink.drain()
+            archive.writestr('manifest.json', json.dumps({'items': manifest}, indent=2))
+        yield from sink.drain()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={
+            'Content-Disposition': 'attachment; filename=nexusvoice_batch.zip',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# ---------------- Voice Conversation Endpoint ----------------
+def stream_llm_sentences(prompt, timings):
+    """Streams the LLM reply and yields each sentence as soon as it is complete."""
+    started = time.perf_counter()
+    buffer = SentenceBuffer()
+    with provider_slot('openai', llm_cost(prompt)):
+        stream = until_deadline(request_llm().stream(prompt), 'openai')
+        try:
+            for chunk in stream:
+                if 'llm_first_token' not in timings:
+                    timings['llm_first_token'] = time.perf_counter() - started
+                for sentence in buffer.feed(chunk.content):
+                    timings.setdefault('llm_first_sentence', time.perf_counter() - started)
+                    yield sentence
+        finally:
+            # Closing the stream aborts the upstream completion request
+            stream.close()
+    rest = buffer.flush()
+    if rest:
+        timings.setdefault('llm_first_sentence', time.perf_counter() - started)
+        yield rest
+    timings['llm_total'] = time.perf_counter() - started
+
+def server_timing(timings):
+    # The tts-feeder thread may still be adding LLM stages; copying the dict is atomic, iterating it isn't
+    timings = dict(timings)
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+@app.route('/api/converse', methods=['POST'])
+def converse():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No audio file provided'}), 400
+
+    audio_file = request.files['file']
+    language = request.form.get('language', 'en')
+    processing_type = request.form.get('type', 'respond')
 
+    if language not in SUPPORTED_LANGUAGES:
         return jsonify({
-            'original_text': text,
-            'processed_text': processed_text,
-            'language': language,
-            'language_name': SUPPORTED_LANGUAGES[language]['name'],
-            'language_flag': SUPPORTED_LANGUAGES[language]['flag'],
-            'processing_type': processing_type
+            'error': 'Unsupported language',
+            'supported_languages': SUPPORTED_LANGUAGES
+        }), 400
+
+    voice_id = request.form.get('voice_id', VOICE_MAP['Alice'][language])
+    timings = {}
+    started = time.perf_counter()
+
+    try:
+        result = transcribe_audio(audio_file.read(), language)
+        timings['stt'] = time.perf_counter() - started
+        if result is None:
+            return jsonify({'error': 'Transcription failed'}), 500
+
+        transcript, confidence, _ = result
+        if not transcript.strip():
+            return jsonify({'error': 'No speech detected'}), 422
+
+        # LLM sentences feed TTS while the model is still generating
+        sentences = stream_llm_sentences(build_prompt(processing_type, language, transcript), timings)
+        audio_stream = stream_tts_segments(sentences, voice_id)
+        tts_started = time.perf_counter()
+
+        def timed_stream():
+            try:
+                yield from audio_stream
+            finally:
+                audio_stream.close()
+                timings['total'] = time.perf_counter() - started
+                logger.info(f"Converse turn timings: {server_timing(timings)}")
+
+        stream = timed_stream()
+        response = audio_stream_response(stream, headers={
+            'X-Transcript': quote(transcript),
+            'X-Transcript-Confidence': str(confidence),
+            'Access-Control-Expose-Headers': 'X-Transcript, X-Transcript-Confidence, Server-Timing'
         })
+        if response is None:
+            return jsonify({'error': 'Failed to generate audio'}), 500
+
+        timings['tts_first_byte'] = time.perf_counter() - tts_started
+        response.headers['Server-Timing'] = server_timing(timings)
+        return response
 
+    except Rejected:
+        raise
     except Exception as e:
-        logger.error(f"Text processing failed: {str(e)}")
-        return jsonify({'error': f"Text processing failed: {str(e)}"}), 500
+        logger.error(f"Voice conversation failed: {str(e)}")
+        return jsonify({'error': 'Voice conversation failed'}), 500
 
 # ---------------- Server Configuration ----------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     logger.info(f"Starting Nexus Voice AI server on port {port}...")
-    serve(app, host="0.0.0.0", port=port, threads=16)
+    serve(app, host="0.0.0.0", port=port, threads=SERVER_THREADS)
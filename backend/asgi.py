@@ -0,0 +1,537 @@
+"""ASGI serving mode.
+
+The upstream-bound routes (/api/stt, /api/tts, /api/process) are served natively
+on the event loop with the shared async clients from upstream.py, so in-flight
+upstream calls are no longer capped by the WSGI thread count. Live transcription
+over WebSocket (/ws/stt) is only available in this mode. Every other route is
+served by the Flask app, mounted as WSGI.
+
+Run with `python asgi.py` or `uvicorn asgi:application`.
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import anyio
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from elevenlabs import AsyncElevenLabs
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+import app as wsgi
+import metrics
+import upstream
+from audio_preprocessing import prepare_audio, passthrough, stitch
+from live_stt import create_live_backend
+from scheduler import (
+    DeadlineExceeded, Overloaded, Rejected, auntil_deadline, await_result, request_policy, set_request_policy
+)
+from text_chunking import sentence_segments
+from tts_cache import AudioCache
+
+logger = wsgi.logger
+
+async_el_client = AsyncElevenLabs(
+    api_key=wsgi.ELEVENLABS_API_KEY,
+    base_url=upstream.ELEVENLABS_BASE_URL,
+    httpx_client=upstream.async_http_client('elevenlabs')
+)
+
+# Same limits, queues and rate limits as the Flask routes, awaited on the event loop
+provider_slot = wsgi.scheduler.aslot
+
+def unsupported_language():
+    return JSONResponse({
+        'error': 'Unsupported language',
+        'supported_languages': wsgi.SUPPORTED_LANGUAGES
+    }, status_code=400)
+
+def wants_stream(request):
+    return request.query_params.get('stream') in ('1', 'true')
+
+# ---------------- Speech to Text ----------------
+async def speech_to_text(request):
+    form = await request.form()
+    if 'file' not in form:
+        return JSONResponse({'error': 'No audio file provided'}, status_code=400)
+
+    language = form.get('language', 'en')
+    if language not in wsgi.SUPPORTED_LANGUAGES:
+        return unsupported_language()
+
+    try:
+        audio_data = await form['file'].read()
+        if wsgi.AUDIO_PREPROCESS:
+            segments = await run_in_threadpool(prepare_audio, audio_data)
+        else:
+            segments = passthrough(audio_data)
+
+        async def transcribe_segment(segment):
+            async with provider_slot('deepgram'):
+                return await upstream.transcribe_async(wsgi.DEEPGRAM_API_KEY, segment.data, language, segment.mimetype)
+
+        result = stitch(segments, await asyncio.gather(*(transcribe_segment(s) for s in segments)))
+        if result is None:
+            return JSONResponse({'error': 'Transcription failed'}, status_code=500)
+
+        transcript, confidence, words = result
+        return JSONResponse({
+            'text': transcript,
+            'confidence': confidence,
+            'words': words,
+            'language': language,
+            'language_name': wsgi.SUPPORTED_LANGUAGES[language]['name'],
+            'language_flag': wsgi.SUPPORTED_LANGUAGES[language]['flag']
+        })
+
+    except Rejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing speech-to-text: {str(e)}")
+        return JSONResponse({'error': 'Speech-to-text conversion failed'}, status_code=500)
+
+# ---------------- Live Speech to Text ----------------
+live_backend = create_live_backend(os.getenv("STT_LIVE_BACKEND", "deepgram"), wsgi.DEEPGRAM_API_KEY)
+
+async def live_transcription(websocket):
+    """Relays binary audio frames to the live backend and pushes transcript events back as JSON.
+
+    Query parameters: language, and for raw PCM: encoding (e.g. linear16),
+    sample_rate, channels. Send {"type": "stop"} to flush and end the stream.
+    """
+    await websocket.accept()
+    language = websocket.query_params.get('language', 'en')
+    if language not in wsgi.SUPPORTED_LANGUAGES:
+        await websocket.send_json({'type': 'error', 'error': 'Unsupported language'})
+        await websocket.close(code=1008)
+        return
+
+    params = websocket.query_params
+    try:
+        # Held for the whole session, so live streams count against DEEPGRAM_LIVE_MAX_SESSIONS
+        async with provider_slot('deepgram_live'):
+            try:
+                session = await live_backend.open(
+                    language,
+                    encoding=params.get('encoding'),
+                    sample_rate=int(params['sample_rate']) if 'sample_rate' in params else None,
+                    channels=int(params['channels']) if 'channels' in params else None
+                )
+            except Exception as e:
+                logger.error(f"Live transcription failed to start: {str(e)}")
+                await websocket.send_json({'type': 'error', 'error': 'Live transcription unavailable'})
+                await websocket.close(code=1011)
+                return
+            await relay_live_session(websocket, session)
+    except Rejected as e:
+        await websocket.send_json({'type': 'error', 'error': str(e)})
+        # 1013: try again later
+        await websocket.close(code=1013)
+
+async def relay_live_session(websocket, session):
+    async def forward_audio():
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', 1000))
+            if message.get('bytes'):
+                await session.send(message['bytes'])
+            elif message.get('text') and json.loads(message['text']).get('type') == 'stop':
+                break
+        await session.finish()
+
+    async def forward_results():
+        async for event in session.results():
+            await websocket.send_json(event)
+
+    audio_task = asyncio.create_task(forward_audio())
+    results_task = asyncio.create_task(forward_results())
+    try:
+        # Results end once the backend has flushed after finish(); a disconnect ends the audio task early
+        done, _ = await asyncio.wait({audio_task, results_task}, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+        await results_task
+        await websocket.send_json({'type': 'closed'})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Live transcription failed: {str(e)}")
+        await websocket.send_json({'type': 'error', 'error': 'Live transcription failed'})
+        await websocket.close(code=1011)
+    finally:
+        audio_task.cancel()
+        results_task.cancel()
+        await session.close()
+
+# ---------------- Text to Speech ----------------
+def cached_audio_response(entry):
+    headers = {
+        'ETag': f'"{entry.key}"',
+        'Cache-Control': 'public, max-age=86400',
+        'Content-Location': f"/api/tts/audio/{entry.key}"
+    }
+    if entry.data is not None:
+        headers['Content-Disposition'] = 'attachment; filename="nexusvoice_audio.mp3"'
+        return Response(entry.data, media_type="audio/mpeg", headers=headers)
+    return FileResponse(entry.path, media_type="audio/mpeg", filename="nexusvoice_audio.mp3", headers=headers)
+
+async def synthesize(text, voice_id):
+    async with provider_slot('elevenlabs', len(text)):
+        return b''.join([
+            chunk async for chunk in auntil_deadline(async_el_client.text_to_speech.convert(
+                voice_id, text=text, model_id=wsgi.TTS_MODEL, request_options=upstream.elevenlabs_request_options()
+            ), 'elevenlabs')
+        ])
+
+async def _synthesize_and_cache(text, voice_id, key):
+    audio_data = await synthesize(text, voice_id)
+    return await run_in_threadpool(wsgi.tts_cache.put, key, audio_data) if audio_data else None
+
+async def cached_synthesis(text, voice_id, key):
+    # Shares the flight with identical misses on the Flask routes and worker threads
+    future, shared = wsgi.tts_cache.flights.start(key, lambda: _synthesize_and_cache(text, voice_id, key))
+    if shared:
+        wsgi.tts_cache.record_coalesced()
+    # One disconnecting caller doesn't cancel the call for the others, and nobody waits past its deadline
+    return await await_result(asyncio.wrap_future(future), 'elevenlabs')
+
+async def stream_tts_segments(segments, voice_id):
+    """Synthesizes up to TTS_STREAM_LOOKAHEAD segments concurrently and yields their audio in order."""
+    queues = [asyncio.Queue() for _ in segments]
+    tasks = []
+
+    async def run(index):
+        chunks = queues[index]
+        try:
+            async with provider_slot('elevenlabs', len(segments[index])):
+                audio = auntil_deadline(async_el_client.text_to_speech.convert(
+                    voice_id, text=segments[index], model_id=wsgi.TTS_MODEL,
+                    request_options=upstream.elevenlabs_request_options()
+                ), 'elevenlabs')
+                try:
+                    async for chunk in audio:
+                        if chunk:
+                            chunks.put_nowait(chunk)
+                finally:
+                    await audio.aclose()
+        except Exception as e:
+            chunks.put_nowait(e)
+        finally:
+            chunks.put_nowait(None)
+
+    def start(index):
+        if index < len(segments):
+            tasks.append(asyncio.create_task(run(index)))
+
+    try:
+        for index in range(wsgi.TTS_STREAM_LOOKAHEAD):
+            start(index)
+        for index, chunks in enumerate(queues):
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+            start(index + wsgi.TTS_STREAM_LOOKAHEAD)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def tts_stream_response(text, voice_id, key):
+    audio_stream = stream_tts_segments(sentence_segments(text, wsgi.TTS_STREAM_SEGMENT_CHARS), voice_id)
+    # Pull the first chunk before committing to a 200 so upstream errors still map to a JSON error
+    first_chunk = await anext(audio_stream, None)
+    if first_chunk is None:
+        return None
+
+    async def generate():
+        writer = await run_in_threadpool(wsgi.tts_cache.writer, key)
+        completed = False
+        try:
+            await run_in_threadpool(writer.write, first_chunk)
+            yield first_chunk
+            async for chunk in audio_stream:
+                await run_in_threadpool(writer.write, chunk)
+                yield chunk
+            completed = True
+        except Exception as e:
+            logger.error(f"Audio stream failed: {str(e)}")
+        finally:
+            # Also runs when the client disconnects and the response is cancelled
+            with anyio.CancelScope(shield=True):
+                await audio_stream.aclose()
+                await run_in_threadpool(writer.commit if completed else writer.abort)
+
+    return StreamingResponse(generate(), media_type="audio/mpeg", headers={
+        'Content-Disposition': 'attachment; filename=nexusvoice_audio.mp3',
+        'X-Accel-Buffering': 'no'
+    })
+
+async def text_to_speech(request):
+    data = await request.json()
+    text = data.get('text', '').strip()
+    language = data.get('language', 'en')
+    voice_id = data.get('voice_id', wsgi.VOICE_MAP['Alice'][language])
+
+    if not text:
+        return JSONResponse({'error': 'No text provided'}, status_code=400)
+
+    try:
+        key = AudioCache.make_key(text, voice_id, wsgi.TTS_MODEL)
+        # The cache touches the disk (and may read up to a hot-tier item); keep that off the event loop
+        entry = await run_in_threadpool(wsgi.tts_cache.get, key)
+        if entry is None and wants_stream(request):
+            response = await tts_stream_response(text, voice_id, key)
+            if response is None:
+                return JSONResponse({'error': 'Failed to generate audio'}, status_code=500)
+            return response
+
+        if entry is None:
+            entry = await cached_synthesis(text, voice_id, key)
+            if entry is None:
+                return JSONResponse({'error': 'Failed to generate audio'}, status_code=500)
+
+        return cached_audio_response(entry)
+    except Rejected:
+        raise
+    except Exception as e:
+        logger.error(f"Text-to-speech conversion failed: {str(e)}")
+        return JSONResponse({'error': 'Text-to-speech conversion failed'}, status_code=500)
+
+# ---------------- Text Processing ----------------
+async def _invoke_and_cache(prompt, key):
+    async with provider_slot('openai', wsgi.llm_cost(prompt)):
+        content = (await wsgi.request_llm().ainvoke(prompt)).content
+    await run_in_threadpool(wsgi.llm_cache.set, key, content)
+    return content
+
+async def llm_complete(prompt):
+    key = wsgi.llm_cache_key(prompt)
+    # The SQLite tier blocks, and its lock is shared with the Flask and pool threads
+    cached = await run_in_threadpool(wsgi.llm_cache.get, key)
+    if cached is not None:
+        return cached
+
+    future, shared = wsgi.llm_cache.flights.start(key, lambda: _invoke_and_cache(prompt, key))
+    if shared:
+        wsgi.llm_cache.record_coalesced()
+    # One disconnecting caller doesn't cancel the call for the others, and nobody waits past its deadline
+    return await await_result(asyncio.wrap_future(future), 'openai')
+
+async def run_n8n_workflow(text, language, processing_type):
+    url = wsgi.n8n_webhook_url()
+    if url is None:
+        return wsgi.N8N_NOT_CONFIGURED
+
+    payload = {
+        "text": text,
+        "language": language,
+        "processing_type": processing_type
+    }
+    async with provider_slot('n8n'):
+        response = await upstream.async_http_client('n8n').post(url, json=payload, timeout=upstream.request_timeout())
+    response.raise_for_status()
+    return response.json().get("processed_text", "Error processing with n8n")
+
+async def token_stream(text, language, processing_type):
+    if processing_type == 'n8n':
+        yield await run_n8n_workflow(text, language, processing_type)
+        return
+    if wsgi.needs_chunking(processing_type, text):
+        # Map-reduce fans out on the OpenAI pool; iterate it from a worker thread
+        async for token in iterate_in_threadpool(wsgi.stream_with_llm(processing_type, language, text)):
+            yield token
+        return
+
+    prompt = wsgi.build_prompt(processing_type, language, text)
+    key = wsgi.llm_cache_key(prompt)
+    cached = await run_in_threadpool(wsgi.llm_cache.get, key)
+    if cached is None:
+        # Like stream_with_llm, join an identical call in flight instead of starting another
+        future = wsgi.llm_cache.flights.pending(key)
+        if future is not None:
+            wsgi.llm_cache.record_coalesced()
+            cached = await await_result(asyncio.wrap_future(future), 'openai')
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async with provider_slot('openai', wsgi.llm_cost(prompt)):
+        stream = auntil_deadline(wsgi.request_llm().astream(prompt), 'openai')
+        try:
+            async for chunk in stream:
+                parts.append(chunk.content)
+                yield chunk.content
+        finally:
+            # Closing the stream aborts the upstream completion request
+            await stream.aclose()
+    await run_in_threadpool(wsgi.llm_cache.set, key, ''.join(parts))
+
+async def process_events(text, language, processing_type, started, first, tokens):
+    parts = []
+    completed = False
+    try:
+        for token in first:
+            if token:
+                parts.append(token)
+                yield wsgi.sse_event('token', {'text': token})
+        async for token in tokens:
+            if token:
+                parts.append(token)
+                yield wsgi.sse_event('token', {'text': token})
+        completed = True
+        result = wsgi.process_result(text, ''.join(parts), language, processing_type)
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000)
+        yield wsgi.sse_event('done', result)
+    except Rejected as e:
+        yield wsgi.rejected_event(e)
+    except Exception as e:
+        logger.error(f"Text processing stream failed: {str(e)}")
+        yield wsgi.sse_event('error', {'error': f"Text processing failed: {str(e)}"})
+    finally:
+        if not completed:
+            logger.info(f"Text processing stream stopped after {len(parts)} chunks; cancelling upstream generation")
+        await tokens.aclose()
+
+async def process_stream_response(text, language, processing_type):
+    started = time.perf_counter()
+    tokens = token_stream(text, language, processing_type)
+    # Pull the first token, which waits for the provider slot, before committing to a 200 so
+    # overload and deadlines are still answered with 429 and 504
+    try:
+        first = [await anext(tokens)]
+    except StopAsyncIteration:
+        first = []
+    return StreamingResponse(
+        process_events(text, language, processing_type, started, first, tokens),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def process_text(request):
+    data = await request.json()
+    text = data.get('text', '').strip()
+    language = data.get('language', 'en')
+    processing_type = data.get('type', 'summarize')
+
+    if not text:
+        return JSONResponse({'error': 'No text provided'}, status_code=400)
+
+    if language not in wsgi.SUPPORTED_LANGUAGES:
+        return unsupported_language()
+
+    try:
+        if wants_stream(request):
+            return await process_stream_response(text, language, processing_type)
+        if processing_type == 'n8n':
+            processed_text = await run_n8n_workflow(text, language, processing_type)
+        elif wsgi.needs_chunking(processing_type, text):
+            processed_text = await run_in_threadpool(wsgi.process_with_llm, processing_type, language, text)
+        else:
+            processed_text = await llm_complete(wsgi.build_prompt(processing_type, language, text))
+
+        return JSONResponse(wsgi.process_result(text, processed_text, language, processing_type))
+
+    except Rejected:
+        raise
+    except Exception as e:
+        logger.error(f"Text processing failed: {str(e)}")
+        return JSONResponse({'error': f"Text processing failed: {str(e)}"}, status_code=500)
+
+# ---------------- Application ----------------
+# Same endpoint labels as the Flask views, so metrics line up across serving modes
+NATIVE_ENDPOINTS = {'/api/stt': 'speech_to_text', '/api/tts': 'text_to_speech', '/api/process': 'process_text'}
+TRACE_HEADER = wsgi.TRACE_HEADER.lower().encode()
+
+class RequestTracing:
+    """Applies the request policy to the native routes, times them and counts their bytes.
+
+    Flask does both for the requests it serves itself.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        endpoint = NATIVE_ENDPOINTS.get(scope['path']) if scope['type'] == 'http' else None
+        if endpoint is None:
+            await self.app(scope, receive, send)
+            return
+
+        set_request_policy(*request_policy(Headers(scope=scope)))
+        trace = metrics.start_trace(endpoint)
+        traced = any(name == TRACE_HEADER for name, _ in scope['headers'])
+        received, sent, status = 0, 0, 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if traced:
+                    message['headers'] = list(message['headers']) + [
+                        (b'server-timing', trace.server_timing().encode()),
+                        (b'access-control-expose-headers', b'Server-Timing')
+                    ]
+            elif message['type'] == 'http.response.body':
+                sent += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            metrics.finish_trace(trace, status, received, sent)
+
+async def provider_overloaded(request, e):
+    return JSONResponse({'error': str(e)}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+
+async def deadline_exceeded(request, e):
+    return JSONResponse({'error': str(e)}, status_code=504)
+
+@asynccontextmanager
+async def lifespan(_):
+    yield
+    await upstream.aclose_async_clients()
+    upstream.close_clients()
+
+application = Starlette(
+    routes=[
+        Route('/api/stt', speech_to_text, methods=['POST']),
+        Route('/api/tts', text_to_speech, methods=['POST']),
+        Route('/api/process', process_text, methods=['POST']),
+        WebSocketRoute('/ws/stt', live_transcription),
+        # Everything else (health, batch, converse, cached audio) stays on Flask
+        Mount('/', app=WSGIMiddleware(wsgi.app, workers=wsgi.SERVER_THREADS))
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=wsgi.CORS_ORIGINS, allow_methods=['*'], allow_headers=['*']),
+        Middleware(RequestTracing)
+    ],
+    exception_handlers={Overloaded: provider_overloaded, DeadlineExceeded: deadline_exceeded},
+    lifespan=lifespan
+)
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    logger.info(f"Starting Nexus Voice AI ASGI server on port {port}...")
+    uvicorn.run(application, host="0.0.0.0", port=port, timeout_keep_alive=30)
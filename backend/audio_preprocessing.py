@@ -0,0 +1,286 @@
+"""Audio preprocessing before upload to speech-to-text.
+
+prepare_audio() detects the real container of an upload. Audio it can decode
+(PCM WAV, plus FLAC/OGG/float WAV when soundfile is installed) is downmixed to
+mono, downsampled to 16 kHz, trimmed of silence and long pauses, re-encoded
+compactly and split into segments that can be transcribed in parallel. Every
+segment carries a TimeMap back to the original recording. Anything else (and
+everything when NumPy is missing) is passed through with the detected mimetype.
+"""
+import io
+import logging
+import os
+import wave
+from bisect import bisect_right
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+logger = logging.getLogger("Nexus Voice AI")
+
+TARGET_SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# A frame is speech when louder than both the absolute floor and (loudest frames - dynamic range)
+SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", -50))
+VAD_DYNAMIC_RANGE_DB = float(os.getenv("AUDIO_VAD_DYNAMIC_RANGE_DB", 35))
+SPEECH_PAD_SECONDS = 0.2
+MAX_PAUSE_SECONDS = float(os.getenv("AUDIO_MAX_PAUSE_SECONDS", 0.8))
+KEPT_PAUSE_SECONDS = 0.3
+SEGMENT_SECONDS = float(os.getenv("AUDIO_SEGMENT_SECONDS", 240))
+# Cuts between segments go at the quietest frame in this window before the target length
+SEGMENT_CUT_WINDOW_SECONDS = 10
+UPLOAD_FORMAT = os.getenv("AUDIO_UPLOAD_FORMAT", "flac")
+
+AudioSegment = namedtuple('AudioSegment', ['data', 'mimetype', 'time_map'])
+
+
+class TimeMap:
+    """Maps times in processed audio back to times in the original recording."""
+
+    def __init__(self, spans):
+        # (processed_start, original_start) in seconds, one per contiguous kept span
+        self._processed = [span[0] for span in spans]
+        self._original = [span[1] for span in spans]
+
+    @classmethod
+    def identity(cls):
+        return cls([(0.0, 0.0)])
+
+    def __call__(self, seconds):
+        index = max(0, bisect_right(self._processed, seconds) - 1)
+        return round(self._original[index] + seconds - self._processed[index], 3)
+
+
+def detect_format(data):
+    """Returns the mimetype for the container signature at the start of data."""
+    head = data[:12]
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'audio/wav'
+    if head[:4] == b'fLaC':
+        return 'audio/flac'
+    if head[:4] == b'OggS':
+        return 'audio/ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'audio/webm'
+    if head[4:8] == b'ftyp':
+        return 'audio/mp4'
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'audio/mpeg'
+    # Deepgram sniffs the format itself when it isn't declared
+    return 'application/octet-stream'
+
+
+def passthrough(data):
+    return [AudioSegment(data, detect_format(data), TimeMap.identity())]
+
+
+def _read_wav(data):
+    with wave.open(io.BytesIO(data)) as reader:
+        channels, width, rate = reader.getnchannels(), reader.getsampwidth(), reader.getframerate()
+        frames = reader.readframes(reader.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = (np.where(values >= 1 << 23, values - (1 << 24), values) / float(1 << 23)).astype(np.float32)
+    elif width == 4:
+        samples = (np.frombuffer(frames, dtype='<i4') / float(1 << 31)).astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def decode(data, mimetype):
+    """Returns (samples as float32 [frames, channels], sample rate), or None when it can't decode."""
+    if mimetype == 'audio/wav':
+        try:
+            return _read_wav(data)
+        except (wave.Error, ValueError, EOFError):
+            # Float and WAVE_FORMAT_EXTENSIBLE files need soundfile
+            pass
+    if soundfile is not None and mimetype in ('audio/wav', 'audio/flac', 'audio/ogg'):
+        try:
+            return soundfile.read(io.BytesIO(data), dtype='float32', always_2d=True)
+        except Exception as e:
+            logger.warning(f"Could not decode {mimetype} audio: {str(e)}")
+    return None
+
+
+def resample(samples, rate, target=TARGET_SAMPLE_RATE):
+    # Only downsample: upsampling narrowband audio adds bytes, not information
+    if rate <= target:
+        return samples, rate
+    if rate % target == 0:
+        # Integer ratios (48k, 32k): averaging each block both low-passes and decimates
+        factor = rate // target
+        usable = len(samples) // factor * factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1), target
+
+    # Moving-average low-pass to limit aliasing, then linear interpolation
+    width = int(round(rate / target))
+    if width > 1:
+        samples = np.convolve(samples, np.full(width, 1.0 / width, dtype=np.float32), mode='same')
+    positions = np.arange(int(len(samples) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32), target
+
+
+def frame_levels(samples, frame):
+    """Returns the level in dBFS of each whole frame of samples."""
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame)
+    return 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+
+def speech_frames(levels):
+    if not len(levels):
+        return np.zeros(0, dtype=bool)
+    threshold = max(SILENCE_DB, np.percentile(levels, 95) - VAD_DYNAMIC_RANGE_DB)
+    voiced = levels > threshold
+    # Pad speech on both sides so word onsets and tails aren't clipped
+    pad = int(SPEECH_PAD_SECONDS / FRAME_SECONDS)
+    if pad and voiced.any():
+        voiced = np.convolve(voiced, np.ones(2 * pad + 1), mode='same') > 0
+    return voiced
+
+
+def _runs(mask):
+    """Returns (start, end) index pairs of the runs of True in mask."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def kept_spans(voiced, frame, total):
+    """Returns the (start, end) sample ranges to keep: speech, with pauses shortened and ends trimmed."""
+    max_pause = int(MAX_PAUSE_SECONDS / FRAME_SECONDS)
+    half_kept = int(KEPT_PAUSE_SECONDS / FRAME_SECONDS) // 2
+    keep = voiced.copy()
+    for start, end in _runs(~voiced):
+        if start == 0 or end == len(voiced):
+            continue
+        if end - start <= max_pause:
+            keep[start:end] = True
+        else:
+            keep[start:start + half_kept] = True
+            keep[end - half_kept:end] = True
+
+    spans = [(start * frame, end * frame) for start, end in _runs(keep)]
+    if spans and spans[-1][1] == len(voiced) * frame:
+        # The last partial frame goes with the final span
+        spans[-1] = (spans[-1][0], total)
+    return spans
+
+
+def encode(samples, rate):
+    if UPLOAD_FORMAT == 'flac' and soundfile is not None:
+        buffer = io.BytesIO()
+        soundfile.write(buffer, samples, rate, format='FLAC', subtype='PCM_16')
+        return buffer.getvalue(), 'audio/flac'
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue(), 'audio/wav'
+
+
+def segment_bounds(samples, rate):
+    """Splits samples into (start, end) ranges of at most SEGMENT_SECONDS, cutting at quiet frames."""
+    limit = int(SEGMENT_SECONDS * rate)
+    frame = int(FRAME_SECONDS * rate)
+    window = min(int(SEGMENT_CUT_WINDOW_SECONDS * rate), limit // 2)
+    bounds, start = [], 0
+    while len(samples) - start > limit:
+        search_start = start + max(limit - window, frame)
+        levels = frame_levels(samples[search_start:start + limit], frame)
+        cut = search_start + int(np.argmin(levels)) * frame if len(levels) else start + limit
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, len(samples)))
+    return bounds
+
+
+def _segment_map(spans, start, end, rate):
+    # spans are (processed_start, original_start) in samples; keep those overlapping [start, end)
+    index = max(0, bisect_right([span[0] for span in spans], start) - 1)
+    mapped = []
+    for processed, original in spans[index:]:
+        if processed >= end:
+            break
+        offset = max(start - processed, 0)
+        mapped.append(((processed + offset - start) / rate, (original + offset) / rate))
+    return TimeMap(mapped)
+
+
+def prepare_audio(data):
+    """Returns the AudioSegments to transcribe for an upload; empty when it holds no speech."""
+    mimetype = detect_format(data)
+    if np is None:
+        return passthrough(data)
+    decoded = decode(data, mimetype)
+    if decoded is None:
+        return passthrough(data)
+
+    samples, rate = decoded
+    original_seconds = len(samples) / rate if rate else 0
+    samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    samples, rate = resample(samples, rate)
+
+    frame = int(FRAME_SECONDS * rate)
+    spans = kept_spans(speech_frames(frame_levels(samples, frame)), frame, len(samples))
+    if not spans:
+        logger.info(f"No speech detected in {original_seconds:.1f}s of {mimetype} audio")
+        return []
+
+    processed, position = [], 0
+    for start, end in spans:
+        processed.append((position, start))
+        position += end - start
+    samples = np.concatenate([samples[start:end] for start, end in spans])
+
+    segments = []
+    for start, end in segment_bounds(samples, rate):
+        encoded, encoded_type = encode(samples[start:end], rate)
+        segments.append(AudioSegment(encoded, encoded_type, _segment_map(processed, start, end, rate)))
+
+    logger.info(
+        f"Prepared {len(data)} bytes of {mimetype} ({original_seconds:.1f}s) as "
+        f"{sum(len(s.data) for s in segments)} bytes in {len(segments)} segment(s) ({len(samples) / rate:.1f}s kept)"
+    )
+    return segments
+
+
+def stitch(segments, alternatives):
+    """Joins per-segment transcription results into (transcript, confidence, words) in original time.
+
+    Returns None when any segment failed. Speaker labels are assigned per
+    segment by the STT provider and are not reconciled across segments.
+    """
+    if any(alternative is None for alternative in alternatives):
+        return None
+
+    texts, words, weighted, weight = [], [], 0.0, 0
+    for segment, alternative in zip(segments, alternatives):
+        if alternative['transcript'].strip():
+            texts.append(alternative['transcript'].strip())
+        segment_words = alternative.get('words', [])
+        count = max(len(segment_words), 1)
+        weighted += alternative.get('confidence', 0.0) * count
+        weight += count
+        for word in segment_words:
+            words.append({**word, 'start': segment.time_map(word['start']), 'end': segment.time_map(word['end'])})
+
+    return ' '.join(texts), (weighted / weight if weight else 0.0), words
@@ -0,0 +1,173 @@
+"""Benchmarks the backend against local fake upstreams.
+
+Run from the backend folder:
+
+    python -m bench                                  # default scenarios and concurrency levels
+    python -m bench --server asgi --concurrency 1,16
+    python -m bench --save bench/baseline.json       # record a new baseline
+    python -m bench --compare bench/baseline.json    # exit 1 on regressions beyond --tolerance
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.fake_upstreams import FakeUpstreams
+from bench.load import RSSSampler, SCENARIOS, run_level, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPTS = {'waitress': 'app.py', 'asgi': 'asgi.py'}
+
+
+def start_server(kind, port, upstream_env, workdir):
+    env = {
+        **os.environ,
+        **upstream_env,
+        'PORT': str(port),
+        'DEEPGRAM_API_KEY': 'bench',
+        'ELEVENLABS_API_KEY': 'bench',
+        'OPENAI_API_KEY': 'bench',
+        'TTS_CACHE_DIR': os.path.join(workdir, 'tts_cache'),
+        'LLM_CACHE_BACKEND': 'memory',
+        'LLM_CACHE_PATH': os.path.join(workdir, 'llm_cache.sqlite3'),
+    }
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPTS[kind]], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}; see {log.name}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not become healthy; see {log.name}")
+
+
+def format_table(results):
+    header = f"{'scenario':<16}{'conc':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ttfb50':>9}{'ttfb95':>9}{'err':>6}{'rss MB':>9}"
+    lines = [header, '-' * len(header)]
+    for key, result in results.items():
+        scenario, concurrency = key.split('@')
+        latency, ttfb = result['latency_ms'], result['ttfb_ms']
+        lines.append(
+            f"{scenario:<16}{concurrency:>5}{result['throughput_rps']:>9}{str(latency['p50']):>9}"
+            f"{str(latency['p95']):>9}{str(latency['p99']):>9}{str(ttfb['p50']):>9}{str(ttfb['p95']):>9}"
+            f"{result['errors']:>6}{str(result['peak_rss_mb']):>9}"
+        )
+    return '\n'.join(lines)
+
+
+def _change(current, baseline):
+    if current is None or not baseline:
+        return None
+    return (current - baseline) / baseline
+
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions: lower throughput, or higher p95/p99 latency or p95 TTFB."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        change = _change(result['throughput_rps'], base['throughput_rps'])
+        if change is not None and change < -tolerance:
+            regressions.append(f"{key}: throughput {base['throughput_rps']} -> {result['throughput_rps']} rps ({change:+.0%})")
+        for group, name in (('latency_ms', 'p95'), ('latency_ms', 'p99'), ('ttfb_ms', 'p95')):
+            change = _change(result[group][name], base[group][name])
+            if change is not None and change > tolerance:
+                regressions.append(
+                    f"{key}: {group.split('_')[0]} {name} {base[group][name]} -> {result[group][name]} ms ({change:+.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend against local fake upstreams")
+    parser.add_argument('--server', choices=sorted(SERVER_SCRIPTS), default='waitress')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,8', help="comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=10, help="measured seconds per level")
+    parser.add_argument('--warmup', type=float, default=2, help="unmeasured seconds before each level")
+    parser.add_argument('--profile', help="JSON file overriding the fake upstream profile")
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--save', help="write results as the new baseline")
+    parser.add_argument('--compare', help="baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    overrides = None
+    if args.profile:
+        with open(args.profile) as f:
+            overrides = json.load(f)
+    fakes = FakeUpstreams(overrides).start()
+    workdir = tempfile.mkdtemp(prefix='nexus-bench-')
+    process, base_url = start_server(args.server, args.port, fakes.env(), workdir)
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            for concurrency in levels:
+                with RSSSampler(process.pid) as rss:
+                    measured = run_level(base_url, scenario, concurrency, args.duration, args.warmup)
+                summary = summarize(measured, args.duration)
+                summary['peak_rss_mb'] = rss.peak_mb
+                results[f"{scenario}@{concurrency}"] = summary
+                print(f"{scenario}@{concurrency}: {summary['throughput_rps']} rps, "
+                      f"p95 {summary['latency_ms']['p95']} ms, {summary['errors']} errors", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        fakes.stop()
+
+    report = {
+        'server': args.server,
+        'duration_s': args.duration,
+        'profile': fakes.profile,
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'upstream_calls': fakes.counts,
+        'results': results,
+    }
+    print(format_table(results))
+
+    for path in (args.output, args.save):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('server') != args.server:
+            print(f"\nNote: the baseline was recorded with --server {baseline.get('server')}", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%} against {args.compare}:")
+            print('\n'.join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""Local stand-ins for Deepgram, ElevenLabs, OpenAI and the n8n webhook.
+
+One HTTP server answers for all four providers under a path prefix each:
+
+    /deepgram/v1/listen                       prerecorded transcription
+    /elevenlabs/v1/text-to-speech/<voice_id>  chunked MP3-sized byte stream
+    /openai/v1/chat/completions               JSON or SSE (stream=true) completion
+    /n8n/webhook                              {"processed_text": ...}
+
+Each provider has a latency distribution (time to first byte), a streaming
+chunk cadence and an error rate, configured by a profile dict (see
+DEFAULT_PROFILE). Run standalone with `python -m bench.fake_upstreams`.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PROFILE = {
+    "seed": 1234,
+    "deepgram": {
+        "latency": {"dist": "lognormal", "median_ms": 250, "sigma": 0.35},
+        "error_rate": 0.0
+    },
+    "elevenlabs": {
+        "latency": {"dist": "lognormal", "median_ms": 180, "sigma": 0.3},
+        "chunk_interval_ms": 40,
+        "chunk_bytes": 4096,
+        "bytes_per_char": 180,
+        "error_rate": 0.0
+    },
+    "openai": {
+        "latency": {"dist": "lognormal", "median_ms": 300, "sigma": 0.4},
+        "chunk_interval_ms": 25,
+        "completion_tokens": 60,
+        "error_rate": 0.0
+    },
+    "n8n": {
+        "latency": {"dist": "uniform", "min_ms": 100, "max_ms": 400},
+        "error_rate": 0.0
+    }
+}
+
+
+def merge_profile(overrides):
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(profile.get(key), dict):
+            profile[key].update(value)
+        else:
+            profile[key] = value
+    return profile
+
+
+class Latency:
+    def __init__(self, spec, rng):
+        self.spec = spec
+        self.rng = rng
+
+    def sample(self):
+        spec = self.spec
+        dist = spec.get("dist", "fixed")
+        if dist == "fixed":
+            ms = spec.get("ms", 0)
+        elif dist == "uniform":
+            ms = self.rng.uniform(spec["min_ms"], spec["max_ms"])
+        elif dist == "lognormal":
+            ms = self.rng.lognormvariate(0, spec.get("sigma", 0.5)) * spec["median_ms"]
+        else:
+            raise ValueError(f"Unknown latency distribution: {dist}")
+        return max(ms, 0) / 1000
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections or cancelling streams is normal under load
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeUpstreams:
+    def __init__(self, profile=None, host="127.0.0.1", port=0):
+        self.profile = merge_profile(profile)
+        self._rng = random.Random(self.profile.get("seed"))
+        self._rng_lock = threading.Lock()
+        self.counts = {}
+        self.server = _Server((host, port), _handler_for(self))
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the backend at these stand-ins."""
+        return {
+            "DEEPGRAM_API_URL": f"{self.base_url}/deepgram/v1/listen",
+            "ELEVENLABS_BASE_URL": f"{self.base_url}/elevenlabs",
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+            "N8N_WEBHOOK_URL": f"{self.base_url}/n8n/webhook"
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self, provider):
+        return self.profile[provider]
+
+    def latency(self, provider):
+        with self._rng_lock:
+            return Latency(self.profile[provider]["latency"], self._rng).sample()
+
+    def should_fail(self, provider):
+        with self._rng_lock:
+            failed = self._rng.random() < self.profile[provider].get("error_rate", 0)
+            self.counts[provider] = self.counts.get(provider, 0) + 1
+        return failed
+
+
+ROUTES = [
+    (re.compile(r"^/deepgram/v1/listen$"), "deepgram"),
+    (re.compile(r"^/elevenlabs/v1/text-to-speech/[^/]+(/stream)?$"), "elevenlabs"),
+    (re.compile(r"^/openai/v1/chat/completions$"), "openai"),
+    (re.compile(r"^/n8n/webhook$"), "n8n")
+]
+
+
+def _handler_for(fakes):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_chunked(self, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _end_chunked(self):
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0]
+            provider = next((name for pattern, name in ROUTES if pattern.match(path)), None)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if provider is None:
+                self._send_json(404, {"error": "Not found"})
+                return
+
+            time.sleep(fakes.latency(provider))
+            if fakes.should_fail(provider):
+                self._send_json(500, {"error": f"Injected {provider} failure"})
+                return
+            getattr(self, f"_{provider}")(body, fakes.settings(provider))
+
+        def _deepgram(self, body, settings):
+            # Roughly one word per 16 KB of uploaded audio
+            words = [f"word{i}" for i in range(max(1, len(body) // 16000))]
+            self._send_json(200, {"results": {"channels": [{"alternatives": [{
+                "transcript": " ".join(words),
+                "confidence": 0.98,
+                "words": [
+                    {"word": word, "start": i * 0.4, "end": i * 0.4 + 0.3, "confidence": 0.98, "speaker": 0}
+                    for i, word in enumerate(words)
+                ]
+            }]}]}})
+
+        def _elevenlabs(self, body, settings):
+            text = json.loads(body or b"{}").get("text", "")
+            remaining = max(len(text), 1) * settings["bytes_per_char"]
+            self._start_chunked("audio/mpeg")
+            while remaining > 0:
+                size = min(settings["chunk_bytes"], remaining)
+                self._chunk(b"\xff" * size)
+                remaining -= size
+                if remaining:
+                    time.sleep(settings["chunk_interval_ms"] / 1000)
+            self._end_chunked()
+
+        def _openai(self, body, settings):
+            request = json.loads(body or b"{}")
+            tokens = [f"token{i}{'.' if i % 12 == 11 else ''} " for i in range(settings["completion_tokens"])]
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "gpt-3.5-turbo")
+            if not request.get("stream"):
+                time.sleep(settings["chunk_interval_ms"] * len(tokens) / 1000)
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "".join(tokens)}
+                    }],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)}
+                })
+                return
+
+            self._start_chunked("text/event-stream")
+            for i, token in enumerate(tokens + [None]):
+                delta = {"content": token} if token is not None else {}
+                if i == 0:
+                    delta["role"] = "assistant"
+                event = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None if token is not None else "stop"}]
+                }
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+                if token is not None:
+                    time.sleep(settings["chunk_interval_ms"] / 1000)
+            self._chunk(b"data: [DONE]\n\n")
+            self._end_chunked()
+
+        def _n8n(self, body, settings):
+            text = json.loads(body or b"{}").get("text", "")
+            self._send_json(200, {"processed_text": text.upper()})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Deepgram/ElevenLabs/OpenAI/n8n upstreams")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--profile", help="JSON file overriding DEFAULT_PROFILE")
+    args = parser.parse_args()
+
+    overrides = None
+    if args.profile:
+        with open(args.profile) as f:
+            overrides = json.load(f)
+    fakes = FakeUpstreams(overrides, port=args.port)
+    for name, value in fakes.env().items():
+        print(f"{name}={value}")
+    try:
+        fakes.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
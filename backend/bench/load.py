@@ -0,0 +1,206 @@
+"""Closed-loop load driver: N workers each send requests back to back for a fixed time."""
+import io
+import itertools
+import math
+import os
+import re
+import struct
+import threading
+import time
+import wave
+from collections import namedtuple
+
+import httpx
+
+Result = namedtuple('Result', ['latency', 'ttfb', 'status', 'error'])
+
+FILLER = (
+    "The quarterly review covered onboarding, support volume and the roadmap for the voice agent. "
+    "Customers asked for faster replies, clearer summaries and better handling of long calls. "
+    "The team agreed to measure latency at every stage before changing the architecture. "
+)
+
+_sequence = itertools.count()
+_sequence_lock = threading.Lock()
+
+
+def unique_id():
+    # Every request gets distinct text so the TTS and LLM caches never short-circuit the upstream call
+    with _sequence_lock:
+        return next(_sequence)
+
+
+def speech_wav(seconds=5, rate=16000):
+    """A mono 16-bit WAV with a tone in the middle and silence around it, so preprocessing has work to do."""
+    samples = []
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        voiced = seconds * 0.2 < t < seconds * 0.8
+        samples.append(int(9000 * math.sin(2 * math.pi * 220 * t)) if voiced else 0)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+    return buffer.getvalue()
+
+
+_SPEECH = None
+
+
+def _stt(stream):
+    global _SPEECH
+    if _SPEECH is None:
+        _SPEECH = speech_wav()
+    return 'POST', '/api/stt', {'files': {'file': ('speech.wav', _SPEECH, 'audio/wav')}, 'data': {'language': 'en'}}
+
+
+def _tts(stream):
+    text = f"Benchmark sentence number {unique_id()}. " + FILLER[:160]
+    return 'POST', '/api/tts?stream=1' if stream else '/api/tts', {'json': {'text': text, 'language': 'en'}}
+
+
+def _process(stream, processing_type='summarize'):
+    text = f"Meeting notes {unique_id()}. " + FILLER * 2
+    url = '/api/process?stream=1' if stream else '/api/process'
+    return 'POST', url, {'json': {'text': text, 'language': 'en', 'type': processing_type}}
+
+
+SCENARIOS = {
+    'stt': lambda: _stt(False),
+    'tts': lambda: _tts(False),
+    'tts_stream': lambda: _tts(True),
+    'process': lambda: _process(False),
+    'process_stream': lambda: _process(True),
+    'process_n8n': lambda: _process(False, 'n8n'),
+}
+
+
+SSE_EVENT = re.compile(rb'^event: *(\S+)', re.MULTILINE)
+
+
+def stream_error(body):
+    """Why an event stream didn't end with a done event, or None when it did.
+
+    Streams answer with 200 before the work is done, so failures arrive as an error event.
+    """
+    events = SSE_EVENT.findall(body)
+    if events and events[-1] == b'done':
+        return None
+    return f"stream ended with {events[-1].decode()!r} event" if events else "stream ended without a done event"
+
+
+def timed_request(client, method, url, kwargs):
+    started = time.perf_counter()
+    ttfb = None
+    try:
+        with client.stream(method, url, **kwargs) as response:
+            event_stream = response.headers.get('content-type', '').startswith('text/event-stream')
+            body = []
+            for chunk in response.iter_raw():
+                if ttfb is None and chunk:
+                    ttfb = time.perf_counter() - started
+                if event_stream:
+                    body.append(chunk)
+        latency = time.perf_counter() - started
+        error = stream_error(b''.join(body)) if event_stream else None
+        return Result(latency, ttfb if ttfb is not None else latency, response.status_code, error)
+    except httpx.HTTPError as e:
+        return Result(time.perf_counter() - started, None, 0, str(e))
+
+
+class RSSSampler:
+    """Samples the resident set size of a process; peak_mb is None where /proc isn't available."""
+
+    def __init__(self, pid, interval=0.1):
+        self.path = f"/proc/{pid}/status"
+        self.interval = interval
+        self.peak_kb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read_kb(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self._read_kb()
+            if rss is not None:
+                self.peak_kb = max(self.peak_kb or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if os.path.exists(self.path):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def peak_mb(self):
+        return round(self.peak_kb / 1024, 1) if self.peak_kb is not None else None
+
+
+def run_level(base_url, scenario, concurrency, duration, warmup=0.0, timeout=60):
+    """Runs `concurrency` closed-loop workers for warmup + duration seconds; returns the measured results."""
+    make_request = SCENARIOS[scenario]
+    results = []
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    def worker():
+        with httpx.Client(base_url=base_url, timeout=timeout, limits=limits) as client:
+            start.wait()
+            measure_from = time.perf_counter() + warmup
+            deadline = measure_from + duration
+            while time.perf_counter() < deadline:
+                method, url, kwargs = make_request()
+                sent_at = time.perf_counter()
+                result = timed_request(client, method, url, kwargs)
+                if sent_at >= measure_from:
+                    with lock:
+                        results.append(result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values, or None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def summarize(results, duration):
+    ok = [r for r in results if r.error is None and r.status < 400]
+    latencies = [r.latency for r in ok]
+    ttfbs = [r.ttfb for r in ok]
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'throughput_rps': round(len(ok) / duration, 2) if duration else None,
+        'latency_ms': {name: _ms(percentile(latencies, q)) for name, q in (('p50', .5), ('p95', .95), ('p99', .99))},
+        'ttfb_ms': {name: _ms(percentile(ttfbs, q)) for name, q in (('p50', .5), ('p95', .95), ('p99', .99))},
+    }
@@ -0,0 +1,204 @@
+"""Live (streaming) speech-to-text backends.
+
+A backend opens a session per client stream. Sessions accept raw audio frames
+through send(), end the stream with finish(), and yield normalized transcript
+events from results():
+
+    {"type": "interim" | "final", "text": ..., "start": ..., "end": ...,
+     "confidence": ..., "speech_final": ..., "speakers": [...], "words": [...]}
+
+DeepgramLiveBackend relays to Deepgram's streaming API. FakeLiveBackend
+produces deterministic transcripts locally for tests and offline development.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+from websockets.asyncio.client import connect
+
+logger = logging.getLogger("Nexus Voice AI")
+
+DEEPGRAM_LIVE_URL = os.getenv("DEEPGRAM_LIVE_URL", "wss://api.deepgram.com/v1/listen")
+# Deepgram closes idle streams after ~10s without audio
+KEEPALIVE_INTERVAL = 5
+
+
+def transcript_event(message):
+    """Converts a Deepgram Results message into a transcript event, or None for empty interims."""
+    alternative = message["channel"]["alternatives"][0]
+    is_final = message.get("is_final", False)
+    if not alternative.get("transcript") and not is_final:
+        return None
+
+    words = [
+        {
+            "word": word.get("punctuated_word", word["word"]),
+            "start": word["start"],
+            "end": word["end"],
+            "speaker": word.get("speaker")
+        }
+        for word in alternative.get("words", [])
+    ]
+    start = message.get("start", 0.0)
+    return {
+        "type": "final" if is_final else "interim",
+        "text": alternative.get("transcript", ""),
+        "start": start,
+        "end": start + message.get("duration", 0.0),
+        "confidence": alternative.get("confidence"),
+        "speech_final": message.get("speech_final", False),
+        "speakers": sorted({w["speaker"] for w in words if w["speaker"] is not None}),
+        "words": words
+    }
+
+
+class DeepgramLiveSession:
+    def __init__(self, connection):
+        self._ws = connection
+        self._last_send = time.monotonic()
+        self._keepalive = asyncio.create_task(self._keep_alive())
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            if time.monotonic() - self._last_send >= KEEPALIVE_INTERVAL:
+                await self._ws.send(json.dumps({"type": "KeepAlive"}))
+
+    async def send(self, audio):
+        self._last_send = time.monotonic()
+        await self._ws.send(audio)
+
+    async def finish(self):
+        # Deepgram flushes the remaining transcripts and then closes the socket
+        await self._ws.send(json.dumps({"type": "CloseStream"}))
+
+    async def results(self):
+        async for raw in self._ws:
+            message = json.loads(raw)
+            kind = message.get("type")
+            if kind == "Results":
+                event = transcript_event(message)
+                if event is not None:
+                    yield event
+            elif kind == "UtteranceEnd":
+                yield {"type": "utterance_end", "end": message.get("last_word_end")}
+
+    async def close(self):
+        self._keepalive.cancel()
+        await self._ws.close()
+
+
+class DeepgramLiveBackend:
+    name = "deepgram"
+
+    def __init__(self, api_key, url=DEEPGRAM_LIVE_URL):
+        self.api_key = api_key
+        self.url = url
+
+    async def open(self, language, encoding=None, sample_rate=None, channels=None):
+        params = {
+            "model": "nova-2",
+            "language": language,
+            "punctuate": "true",
+            "smart_format": "true",
+            "diarize": "true",
+            "interim_results": "true",
+            "utterance_end_ms": "1000",
+            "vad_events": "false"
+        }
+        # Containerized audio (webm/ogg from MediaRecorder) is detected by Deepgram; raw PCM must be described
+        if encoding:
+            params.update(encoding=encoding, sample_rate=sample_rate or 16000, channels=channels or 1)
+        connection = await connect(
+            f"{self.url}?{urlencode(params)}",
+            additional_headers={"Authorization": f"Token {self.api_key}"},
+            open_timeout=10
+        )
+        return DeepgramLiveSession(connection)
+
+
+class FakeLiveSession:
+    """Turns every `bytes_per_word` bytes of audio into a word; every `words_per_utterance` words is final."""
+
+    def __init__(self, bytes_per_word, words_per_utterance, bytes_per_second):
+        self.bytes_per_word = bytes_per_word
+        self.words_per_utterance = words_per_utterance
+        self.bytes_per_second = bytes_per_second
+        self._events = asyncio.Queue()
+        self._received = 0
+        self._words = []
+        self._utterances = 0
+
+    def _seconds(self, byte_offset):
+        return round(byte_offset / self.bytes_per_second, 3)
+
+    def _event(self, kind):
+        speaker = self._utterances % 2
+        return {
+            "type": kind,
+            "text": " ".join(w["word"] for w in self._words),
+            "start": self._words[0]["start"],
+            "end": self._words[-1]["end"],
+            "confidence": 1.0,
+            "speech_final": kind == "final",
+            "speakers": [speaker],
+            "words": [{**w, "speaker": speaker} for w in self._words]
+        }
+
+    def _finalize(self):
+        if self._words:
+            self._events.put_nowait(self._event("final"))
+            self._words = []
+            self._utterances += 1
+
+    async def send(self, audio):
+        before = self._received // self.bytes_per_word
+        self._received += len(audio)
+        for index in range(before, self._received // self.bytes_per_word):
+            self._words.append({
+                "word": f"word{index + 1}",
+                "start": self._seconds(index * self.bytes_per_word),
+                "end": self._seconds((index + 1) * self.bytes_per_word)
+            })
+            if len(self._words) >= self.words_per_utterance:
+                self._finalize()
+            else:
+                self._events.put_nowait(self._event("interim"))
+
+    async def finish(self):
+        self._finalize()
+        self._events.put_nowait(None)
+
+    async def results(self):
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+    async def close(self):
+        pass
+
+
+class FakeLiveBackend:
+    name = "fake"
+
+    def __init__(self, bytes_per_word=8000, words_per_utterance=5):
+        self.bytes_per_word = bytes_per_word
+        self.words_per_utterance = words_per_utterance
+
+    async def open(self, language, encoding=None, sample_rate=None, channels=None):
+        # Assumes 16-bit PCM for timestamps
+        bytes_per_second = 2 * (sample_rate or 16000) * (channels or 1)
+        return FakeLiveSession(self.bytes_per_word, self.words_per_utterance, bytes_per_second)
+
+
+def create_live_backend(name, api_key=None):
+    if name == "deepgram":
+        return DeepgramLiveBackend(api_key)
+    if name == "fake":
+        return FakeLiveBackend()
+    raise ValueError(f"Unknown live STT backend: {name}")
@@ -0,0 +1,212 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from scheduler import wait_result
+from single_flight import SingleFlight
+
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Local file tier that survives restarts."""
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            if self._count() > self.max_entries:
+                self._db.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+                overflow = self._count() - self.max_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                        (overflow,)
+                    )
+
+    def _count(self):
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+
+class TieredBackend:
+    """Reads through the tiers in order and backfills the faster ones on a hit."""
+
+    def __init__(self, *tiers, backfill_ttl=3600):
+        self.tiers = tiers
+        self.backfill_ttl = backfill_ttl
+        self.name = "+".join(tier.name for tier in tiers)
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for upper in self.tiers[:index]:
+                    # Lower tiers don't report the remaining TTL, so backfills get a fixed one
+                    upper.set(key, value, self.backfill_ttl)
+                return value
+        return None
+
+    def set(self, key, value, ttl):
+        for tier in self.tiers:
+            tier.set(key, value, ttl)
+
+    def __len__(self):
+        return len(self.tiers[-1])
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        # Followers wait no longer than their own request deadline
+        self.flights = SingleFlight(wait_result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            normalized = " ".join(unicodedata.normalize("NFC", str(part)).split())
+            digest.update(normalized.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value):
+        if value:
+            self.backend.set(key, value, self.ttl)
+
+    def record_coalesced(self):
+        self._count("coalesced")
+
+    def wait_pending(self, key):
+        """Returns the result of an identical in-flight call, or None when there is none."""
+        future = self.flights.pending(key)
+        if future is None:
+            return None
+        self.record_coalesced()
+        return wait_result(future)
+
+    def get_or_compute(self, key, fn):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def compute():
+            # A previous flight may have filled the cache between our lookup and becoming leader
+            result = self.backend.get(key)
+            if result is None:
+                result = fn()
+                self.set(key, result)
+            return result
+
+        value, shared = self.flights.do(key, compute)
+        if shared:
+            self._count("coalesced")
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "entries": len(self.backend),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+def create_backend(kind, path, max_entries, ttl):
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if kind == "sqlite":
+        return SQLiteBackend(path, max_entries)
+    if kind == "tiered":
+        return TieredBackend(
+            MemoryBackend(max_entries), SQLiteBackend(path, max_entries * 10), backfill_ttl=min(ttl, 3600)
+        )
+    raise ValueError(f"Unknown LLM cache backend: {kind}")
@@ -0,0 +1,372 @@
+"""Request tracing, latency histograms and a sampling profiler.
+
+Metrics are kept in-process and rendered in the Prometheus text format by
+render(). Each API request gets a RequestTrace (held in a context variable) that
+collects per-stage timings; observe_stage() records a stage both on the trace
+and in the stage histogram. Upstream connect and time-to-first-byte come from
+the httpx event hooks returned by http_event_hooks().
+"""
+import contextvars
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from concurrent.futures import ThreadPoolExecutor
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+
+class CallbackGauge:
+    """Gauge whose values are read from fn() at render time as {label values tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames, fn):
+        self.name, self.help, self.labelnames, self.fn = name, help, labelnames, fn
+
+    def samples(self):
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in self.fn().items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        samples = []
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, [('le', bound)]), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, key), values[-1]))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, key), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "nexus_request_duration_seconds", "Time from request start until the response body was sent.",
+    ("endpoint", "status")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "nexus_stage_duration_seconds",
+    "Per-stage request time: queue_wait for a provider slot, upstream while holding it, "
+    "connect/tls to the provider and ttfb until its response headers.",
+    ("endpoint", "provider", "stage")
+))
+REQUEST_BYTES = registry.register(Counter(
+    "nexus_request_bytes_total", "Request and response body bytes.", ("endpoint", "direction")
+))
+UPSTREAM_REQUESTS = registry.register(Counter(
+    "nexus_upstream_requests_total", "Upstream HTTP responses by status code.", ("provider", "status")
+))
+UPSTREAM_BYTES = registry.register(Counter(
+    "nexus_upstream_bytes_sent_total", "Request body bytes sent to upstream providers.", ("provider",)
+))
+IN_FLIGHT = registry.register(Gauge("nexus_requests_in_flight", "API requests currently being served."))
+PROVIDER_IN_USE = registry.register(Gauge(
+    "nexus_provider_slots_in_use", "Upstream calls currently holding a provider slot.", ("provider",)
+))
+PROVIDER_WAITING = registry.register(Gauge(
+    "nexus_provider_slots_waiting", "Callers waiting for a provider slot.", ("provider",)
+))
+
+
+def render():
+    return registry.render()
+
+
+# ---------------- Request traces ----------------
+class RequestTrace:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        with self._lock:
+            stages = dict(self.stages)
+        stages['total'] = time.perf_counter() - self.started
+        return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items())
+
+
+_current_trace = contextvars.ContextVar('request_trace', default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def start_trace(endpoint):
+    trace = RequestTrace(endpoint)
+    IN_FLIGHT.inc()
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace, status, bytes_in, bytes_out):
+    IN_FLIGHT.dec()
+    REQUEST_SECONDS.observe(time.perf_counter() - trace.started, endpoint=trace.endpoint, status=status)
+    REQUEST_BYTES.inc(bytes_in or 0, endpoint=trace.endpoint, direction="in")
+    REQUEST_BYTES.inc(bytes_out or 0, endpoint=trace.endpoint, direction="out")
+
+
+def clear_trace():
+    _current_trace.set(None)
+
+
+def observe_stage(provider, stage, seconds):
+    trace = _current_trace.get()
+    STAGE_SECONDS.observe(
+        seconds, endpoint=trace.endpoint if trace else "background", provider=provider, stage=stage
+    )
+    if trace is not None:
+        trace.add(f"{provider}_{stage}", seconds)
+
+
+class SlotTimer:
+    """Records queue_wait and upstream stages around a provider slot acquisition."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        PROVIDER_WAITING.inc(provider=provider)
+        self._waiting_since = time.perf_counter()
+        self._acquired = None
+
+    def acquired(self):
+        self._acquired = time.perf_counter()
+        PROVIDER_WAITING.dec(provider=self.provider)
+        PROVIDER_IN_USE.inc(provider=self.provider)
+        observe_stage(self.provider, 'queue_wait', self._acquired - self._waiting_since)
+
+    def released(self):
+        if self._acquired is None:
+            PROVIDER_WAITING.dec(provider=self.provider)
+            return
+        PROVIDER_IN_USE.dec(provider=self.provider)
+        observe_stage(self.provider, 'upstream', time.perf_counter() - self._acquired)
+
+
+# ---------------- Upstream HTTP hooks ----------------
+_CONNECT_STAGES = {'connection.connect_tcp': 'connect', 'connection.start_tls': 'tls'}
+
+
+def _on_request(provider, request, tracer):
+    request.extensions['nexus_started'] = time.perf_counter()
+    request.extensions['trace'] = tracer
+    if 'content-length' in request.headers:
+        UPSTREAM_BYTES.inc(int(request.headers['content-length']), provider=provider)
+
+
+def _on_response(provider, response):
+    started = response.request.extensions.get('nexus_started')
+    if started is not None:
+        observe_stage(provider, 'ttfb', time.perf_counter() - started)
+    UPSTREAM_REQUESTS.inc(provider=provider, status=response.status_code)
+
+
+def _connect_tracer(provider):
+    started = {}
+
+    def trace(event, info):
+        name, _, phase = event.rpartition('.')
+        if name in _CONNECT_STAGES:
+            if phase == 'started':
+                started[name] = time.perf_counter()
+            elif phase in ('complete', 'failed') and name in started:
+                observe_stage(provider, _CONNECT_STAGES[name], time.perf_counter() - started.pop(name))
+    return trace
+
+
+def http_event_hooks(provider):
+    def on_request(request):
+        _on_request(provider, request, _connect_tracer(provider))
+
+    def on_response(response):
+        _on_response(provider, response)
+
+    return {'request': [on_request], 'response': [on_response]}
+
+
+def async_http_event_hooks(provider):
+    async def on_request(request):
+        trace = _connect_tracer(provider)
+
+        async def async_trace(event, info):
+            trace(event, info)
+        _on_request(provider, request, async_trace)
+
+    async def on_response(response):
+        _on_response(provider, response)
+
+    return {'request': [on_request], 'response': [on_response]}
+
+
+# ---------------- Executors ----------------
+class TracedExecutor(ThreadPoolExecutor):
+    """Thread pool that tracks queued/active work and runs each task in the submitter's context."""
+
+    def __init__(self, max_workers, name):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+
+    def _update(self, queued, active):
+        with self._lock:
+            self._queued += queued
+            self._active += active
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+
+        def run():
+            self._update(-1, 1)
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                self._update(0, -1)
+
+        def cancelled(future):
+            # Cancelled tasks never run, so they leave the queue here
+            if future.cancelled():
+                self._update(-1, 0)
+
+        self._update(1, 0)
+        future = super().submit(run)
+        future.add_done_callback(cancelled)
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {'max_workers': self.max_workers, 'active': self._active, 'queued': self._queued}
+
+
+# ---------------- Sampling profiler ----------------
+class StackSampler:
+    """Samples the stacks of all other threads every `interval` seconds.
+
+    Results are collapsed stacks ("outer;inner count" per line), the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = _Tally()
+
+    def _sample(self, own_thread):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def run(self, seconds):
+        own_thread = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self._sample(own_thread)
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self):
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common()) + '\n'
+
+
+_profile_lock = threading.Lock()
+
+
+def profile(seconds, interval=0.01):
+    """Samples every thread for `seconds` and returns collapsed stacks, or None if a profile is already running."""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return StackSampler(interval).run(seconds).collapsed()
+    finally:
+        _profile_lock.release()
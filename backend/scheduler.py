@@ -0,0 +1,454 @@
+"""Admission control for upstream provider calls.
+
+Each provider has a concurrency limit, an optional token-bucket rate limit
+(e.g. LLM tokens or TTS characters per second) and bounded wait queues per
+priority class. Callers ask for a slot with slot() (threads) or aslot()
+(asyncio); both share the same limits.
+
+Interactive callers are always granted before batch callers. Rate-limit
+waits happen before a concurrency slot is taken. A full queue, or a wait for
+a slot or for rate-limit tokens longer than the queue timeout, raises
+Overloaded (served as 429 with Retry-After); a caller whose request
+deadline passes before it gets a slot, or while it is still streaming an
+upstream body, raises DeadlineExceeded (served as 504).
+The priority and deadline of the current request live in context variables,
+so work handed to the thread pools inherits them.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import wait
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+
+class Rejected(Exception):
+    """A provider call was refused, or cut short by the request deadline."""
+
+
+class Overloaded(Rejected):
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is overloaded; retry after {retry_after}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Rejected):
+    def __init__(self, provider=None):
+        super().__init__(f"Request deadline exceeded{f' waiting for {provider}' if provider else ''}")
+        self.provider = provider
+
+
+REJECTIONS = metrics.registry.register(metrics.Counter(
+    "nexus_scheduler_rejections_total", "Provider calls refused by admission control.", ("provider", "reason")
+))
+
+
+# ---------------- Request policy ----------------
+_priority = contextvars.ContextVar('request_priority', default='interactive')
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+def set_request_policy(priority='interactive', deadline_ms=None):
+    """Sets the priority class and the deadline (ms from now, or None) for the current request."""
+    _priority.set(priority if priority in PRIORITIES else 'interactive')
+    _deadline.set(time.monotonic() + deadline_ms / 1000 if deadline_ms else None)
+
+
+def request_policy(headers, default_priority='interactive', deadline_header='X-Request-Deadline-Ms',
+                   priority_header='X-Request-Priority'):
+    """Reads (priority, deadline_ms) from request headers; clients may lower their priority but not raise it."""
+    priority = default_priority
+    if headers.get(priority_header) == 'batch':
+        priority = 'batch'
+    try:
+        deadline_ms = int(headers.get(deadline_header) or 0) or None
+    except ValueError:
+        deadline_ms = None
+    return priority, deadline_ms
+
+
+def current_priority():
+    return _priority.get()
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(provider=None):
+    left = remaining()
+    if left is not None and left <= 0:
+        REJECTIONS.inc(provider=provider or 'none', reason='deadline')
+        raise DeadlineExceeded(provider)
+
+
+def _expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def capped_timeout(default):
+    """`default` seconds, capped by the time left before the current request's deadline."""
+    left = remaining()
+    return default if left is None else max(0.001, min(default, left))
+
+
+def until_deadline(stream, provider=None):
+    """Yields from an upstream stream; once the request deadline passes, closes it and raises DeadlineExceeded.
+
+    Capped timeouts only bound each read, so a body that keeps trickling would never time out.
+    """
+    try:
+        for chunk in stream:
+            check_deadline(provider)
+            yield chunk
+    finally:
+        stream.close()
+
+
+async def auntil_deadline(stream, provider=None):
+    """Async counterpart of until_deadline."""
+    try:
+        async for chunk in stream:
+            check_deadline(provider)
+            yield chunk
+    finally:
+        await stream.aclose()
+
+
+def wait_result(future, provider=None):
+    """future.result(), giving up with DeadlineExceeded once the request deadline passes."""
+    done, _ = wait([future], timeout=remaining())
+    if not done:
+        REJECTIONS.inc(provider=provider or 'none', reason='deadline')
+        raise DeadlineExceeded(provider)
+    return future.result()
+
+
+async def await_result(future, provider=None):
+    """Awaits a shared future until the request deadline; giving up or being cancelled leaves the call running."""
+    try:
+        done, _ = await asyncio.wait({future}, timeout=remaining())
+    finally:
+        if not future.done():
+            # Nobody may look at the outcome now; don't log its failure as never retrieved
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    if not done:
+        REJECTIONS.inc(provider=provider or 'none', reason='deadline')
+        raise DeadlineExceeded(provider)
+    return future.result()
+
+
+# ---------------- Request admission ----------------
+class AdmissionGate:
+    """Caps the requests a thread-per-request server works on at once.
+
+    Requests over the limit are refused straight away with Overloaded instead
+    of waiting in the server's own unbounded queue, and the threads above the
+    limit stay free for health checks.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._hold_seconds = 1.0  # moving average, for Retry-After
+
+    def enter(self):
+        """Admits a request and returns its start time for leave(), or raises Overloaded."""
+        with self._lock:
+            if self._active >= self.limit:
+                REJECTIONS.inc(provider=self.name, reason='admission')
+                raise Overloaded(self.name, max(1, math.ceil(self._hold_seconds / self.limit)))
+            self._active += 1
+        return time.monotonic()
+
+    def leave(self, entered):
+        with self._lock:
+            self._active -= 1
+            self._hold_seconds += 0.2 * (time.monotonic() - entered - self._hold_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'active': self._active}
+
+
+# ---------------- Limits ----------------
+class TokenBucket:
+    """Rate limiter that lets callers reserve ahead.
+
+    The balance may go negative; a caller waits until its reservation would
+    have been refilled, so waits are granted in reservation order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, cost):
+        """Takes cost tokens and returns how many seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= cost
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, cost):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.burst, self._tokens + cost)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class _Waiter:
+    __slots__ = ('priority', 'granted', 'abandoned', '_event', '_loop', '_future')
+
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.granted = False
+        self.abandoned = False
+        self._loop = loop
+        if loop is None:
+            self._event = threading.Event()
+        else:
+            self._future = loop.create_future()
+
+    def wake(self):
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+
+    def wait(self, timeout):
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ProviderLimiter:
+    def __init__(self, name, concurrency, rate=0, burst_seconds=10, max_queue=None, queue_timeout=15):
+        self.name = name
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, rate * burst_seconds) if rate else None
+        self.max_queue = max_queue or {'interactive': 32, 'batch': 256}
+        # Without a request deadline, nobody waits longer than this for a slot
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._queued = dict.fromkeys(PRIORITIES, 0)
+        self._in_use = 0
+        self._hold_seconds = 1.0  # moving average, for Retry-After
+
+    def retry_after(self):
+        queued = sum(self._queued.values())
+        return max(1, math.ceil((queued + 1) * self._hold_seconds / self.concurrency))
+
+    def _first_waiter(self):
+        while self._waiters and self._waiters[0][2].abandoned:
+            heapq.heappop(self._waiters)
+        return self._waiters[0][2] if self._waiters else None
+
+    def _enqueue(self, priority, loop=None):
+        """Takes a free slot (returns None) or queues a waiter; caller holds the lock."""
+        first = self._first_waiter()
+        if self._in_use < self.concurrency and (first is None or PRIORITIES[first.priority] > PRIORITIES[priority]):
+            self._in_use += 1
+            return None
+        if self._queued[priority] >= self.max_queue[priority]:
+            REJECTIONS.inc(provider=self.name, reason='queue_full')
+            raise Overloaded(self.name, self.retry_after())
+        waiter = _Waiter(priority, loop)
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._sequence), waiter))
+        self._queued[priority] += 1
+        return waiter
+
+    def _abandon(self, waiter):
+        """Withdraws a waiter; returns True when it had been granted a slot that must be released."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.abandoned = True
+            self._queued[waiter.priority] -= 1
+            return False
+
+    def _release(self, held_for):
+        with self._lock:
+            self._in_use -= 1
+            self._hold_seconds += 0.2 * (held_for - self._hold_seconds)
+            while self._in_use < self.concurrency:
+                first = self._first_waiter()
+                if first is None:
+                    break
+                heapq.heappop(self._waiters)
+                self._queued[first.priority] -= 1
+                self._in_use += 1
+                first.granted = True
+                first.wake()
+
+    def _wait_budget(self):
+        left = remaining()
+        if left is None:
+            return self.queue_timeout, False
+        return max(0.0, left), True
+
+    def _timed_out(self, by_deadline):
+        if by_deadline:
+            REJECTIONS.inc(provider=self.name, reason='deadline')
+            return DeadlineExceeded(self.name)
+        REJECTIONS.inc(provider=self.name, reason='queue_timeout')
+        return Overloaded(self.name, self.retry_after())
+
+    def _reserve(self, cost):
+        """Reserves rate-limit tokens; returns the wait, or raises when it would outlast the wait budget."""
+        if self.bucket is None or not cost:
+            return 0.0
+        delay = self.bucket.reserve(cost)
+        budget, by_deadline = self._wait_budget()
+        if delay > budget:
+            self.bucket.refund(cost)
+            if by_deadline:
+                REJECTIONS.inc(provider=self.name, reason='deadline')
+                raise DeadlineExceeded(self.name)
+            REJECTIONS.inc(provider=self.name, reason='rate_limit')
+            raise Overloaded(self.name, max(1, math.ceil(delay)))
+        return delay
+
+    def _refund(self, cost):
+        if self.bucket is not None and cost:
+            self.bucket.refund(cost)
+
+    @contextmanager
+    def slot(self, cost=0):
+        check_deadline(self.name)
+        timer = metrics.SlotTimer(self.name)
+        acquired = None
+        reserved = False
+        try:
+            # The rate limit is waited out before taking a concurrency slot, so it never parks one
+            delay = self._reserve(cost)
+            reserved = True
+            if delay:
+                time.sleep(delay)
+            with self._lock:
+                waiter = self._enqueue(current_priority())
+            if waiter is not None:
+                budget, by_deadline = self._wait_budget()
+                if not waiter.wait(budget) and not self._abandon(waiter):
+                    raise self._timed_out(by_deadline)
+            acquired = time.monotonic()
+            timer.acquired()
+            try:
+                yield
+            except Exception as e:
+                # Upstream timeouts are capped by the deadline; report such a failure as the deadline
+                if _expired():
+                    raise DeadlineExceeded(self.name) from e
+                raise
+        finally:
+            timer.released()
+            if acquired is not None:
+                self._release(time.monotonic() - acquired)
+            elif reserved:
+                # The call never ran
+                self._refund(cost)
+
+    @asynccontextmanager
+    async def aslot(self, cost=0):
+        check_deadline(self.name)
+        timer = metrics.SlotTimer(self.name)
+        acquired = None
+        reserved = False
+        waiter = None
+        try:
+            delay = self._reserve(cost)
+            reserved = True
+            if delay:
+                await asyncio.sleep(delay)
+            with self._lock:
+                waiter = self._enqueue(current_priority(), asyncio.get_running_loop())
+            if waiter is not None:
+                budget, by_deadline = self._wait_budget()
+                if not await waiter.wait_async(budget) and not self._abandon(waiter):
+                    raise self._timed_out(by_deadline)
+            acquired = time.monotonic()
+            timer.acquired()
+            try:
+                yield
+            except Exception as e:
+                if _expired():
+                    raise DeadlineExceeded(self.name) from e
+                raise
+        except asyncio.CancelledError:
+            # The client went away while we were queued; a slot granted in the meantime is handed back
+            if acquired is None and waiter is not None and self._abandon(waiter):
+                acquired = time.monotonic()
+            raise
+        finally:
+            timer.released()
+            if acquired is not None:
+                self._release(time.monotonic() - acquired)
+            elif reserved:
+                self._refund(cost)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'concurrency': self.concurrency,
+                'in_use': self._in_use,
+                'queued': dict(self._queued),
+                'max_queue': dict(self.max_queue)
+            }
+        if self.bucket is not None:
+            stats['rate_per_second'] = self.bucket.rate
+            stats['rate_available'] = round(self.bucket.available(), 1)
+        return stats
+
+
+class Scheduler:
+    def __init__(self, limiters):
+        self.limiters = {limiter.name: limiter for limiter in limiters}
+
+    def slot(self, provider, cost=0):
+        return self.limiters[provider].slot(cost)
+
+    def aslot(self, provider, cost=0):
+        return self.limiters[provider].aslot(cost)
+
+    def concurrency(self, provider):
+        return self.limiters[provider].concurrency
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one in-flight call.
+
+    Threads call do(); coroutines call start() and await the returned future
+    with asyncio.wrap_future, so callers on the event loop and on threads join
+    the same flights. Thread followers wait with wait(future), future.result()
+    by default; scheduler.wait_result bounds that wait by the request deadline.
+    """
+
+    def __init__(self, wait=None):
+        self._wait = wait or Future.result
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = set()
+
+    def pending(self, key):
+        with self._lock:
+            return self._calls.get(key)
+
+    def _join(self, key):
+        """Returns (future, leader); the leader settles the future and then calls _leave()."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _leave(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if not leader:
+            return self._wait(future), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    def start(self, key, fn):
+        """Joins the flight for key, or leads it by running the coroutine fn() as a task.
+
+        Returns (future, shared). The task belongs to the flight, so a leader that
+        stops waiting doesn't cancel the call for the others.
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(self._lead(key, future, fn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return future, not leader
+
+    async def _lead(self, key, future, fn):
+        try:
+            future.set_result(await fn())
+        except BaseException as e:
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._leave(key)
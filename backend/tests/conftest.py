@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# app.py exits without API keys; the tests never reach the real providers
+_workdir = tempfile.mkdtemp(prefix='nexus-tests-')
+os.environ.update({
+    'DEEPGRAM_API_KEY': 'test',
+    'ELEVENLABS_API_KEY': 'test',
+    'OPENAI_API_KEY': 'test',
+    'TTS_CACHE_DIR': os.path.join(_workdir, 'tts_cache'),
+    'LLM_CACHE_BACKEND': 'memory',
+    'STT_LIVE_BACKEND': 'fake',
+})
@@ -0,0 +1,94 @@
+import pytest
+from starlette.testclient import TestClient
+from werkzeug.test import EnvironBuilder
+
+import app as wsgi
+from scheduler import AdmissionGate, ProviderLimiter
+from tts_cache import AudioCache
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    gate = AdmissionGate('server', 1)
+    monkeypatch.setattr(wsgi, 'admission', gate)
+    return gate
+
+
+@pytest.fixture
+def client():
+    return wsgi.app.test_client()
+
+
+def test_send_file_response_leaves_the_gate(client, admission, monkeypatch):
+    monkeypatch.setattr(wsgi, 'synthesize', lambda text, voice_id: b'audio')
+    for _ in range(2):
+        response = client.post('/api/tts', json={'text': 'admission check', 'language': 'en'})
+        assert response.status_code == 200
+        assert response.get_data() == b'audio'
+        response.close()
+        assert admission.stats()['active'] == 0
+
+
+def test_refuses_over_the_limit_but_not_health(client, admission):
+    entered = admission.enter()
+    try:
+        response = client.post('/api/tts', json={'text': 'admission check', 'language': 'en'})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert client.get('/health').status_code == 200
+    finally:
+        admission.leave(entered)
+
+
+def test_disk_hit_is_handed_to_the_server_file_wrapper(admission, monkeypatch, tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1024 * 1024, hot_max_bytes=1024, hot_item_max_bytes=16)
+    monkeypatch.setattr(wsgi, 'tts_cache', cache)
+    monkeypatch.setattr(wsgi, 'synthesize', lambda text, voice_id: b'audio' * 100)
+
+    class FileWrapper:
+        def __init__(self, file, block_size=8192):
+            self.file = file
+
+        def __iter__(self):
+            return iter(lambda: self.file.read(8192), b'')
+
+        def close(self):
+            self.file.close()
+
+    environ = EnvironBuilder(method='POST', path='/api/tts', json={'text': 'passthrough check', 'language': 'en'}).get_environ()
+    environ['wsgi.file_wrapper'] = FileWrapper
+    body = wsgi.app(environ, lambda status, headers: None)
+    try:
+        # The server gets its own wrapper back, so it can send the file without copying it
+        assert isinstance(body, FileWrapper)
+        assert admission.stats()['active'] == 0
+        assert b''.join(body) == b'audio' * 100
+    finally:
+        body.close()
+
+
+@pytest.fixture
+def busy_openai(monkeypatch):
+    """The only OpenAI slot is taken and nobody may queue for it."""
+    limiter = ProviderLimiter('openai', 1, max_queue={'interactive': 0, 'batch': 0})
+    monkeypatch.setitem(wsgi.scheduler.limiters, 'openai', limiter)
+    held = limiter.slot()
+    held.__enter__()
+    yield limiter
+    held.__exit__(None, None, None)
+
+
+def test_overloaded_stream_is_refused_before_the_200(client, admission, busy_openai):
+    response = client.post('/api/process?stream=1', json={'text': 'stream admission check', 'language': 'en'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    response.close()
+    assert admission.stats()['active'] == 0
+
+
+def test_overloaded_asgi_stream_is_refused_before_the_200(busy_openai):
+    import asgi
+    with TestClient(asgi.application) as client:
+        response = client.post('/api/process?stream=1', json={'text': 'asgi stream admission check', 'language': 'en'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
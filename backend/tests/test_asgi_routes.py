@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from starlette.concurrency import run_in_threadpool
+from starlette.testclient import TestClient
+
+import asgi
+from tts_cache import AudioCache
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class FakeTextToSpeech:
+    def __init__(self):
+        self.calls = []
+
+    async def convert(self, voice_id, text, **kwargs):
+        self.calls.append(text)
+        for word in text.split():
+            await asyncio.sleep(0)
+            yield word.encode() + b' '
+
+
+@pytest.fixture
+def tts(monkeypatch, tmp_path):
+    fake = FakeTextToSpeech()
+    monkeypatch.setattr(asgi, 'async_el_client', types.SimpleNamespace(text_to_speech=fake))
+    monkeypatch.setattr(asgi.wsgi, 'tts_cache', AudioCache(str(tmp_path), 1024 * 1024, 1024 * 1024))
+    return fake
+
+
+@pytest.fixture
+def client():
+    with TestClient(asgi.application) as client:
+        yield client
+
+
+def record_threads(monkeypatch, target, names, seen):
+    for name in names:
+        method = getattr(target, name)
+
+        def call(*args, _method=method, _name=name):
+            seen.append((_name, on_event_loop()))
+            return _method(*args)
+
+        monkeypatch.setattr(target, name, call)
+
+
+@pytest.mark.parametrize('url', ['/api/tts', '/api/tts?stream=1'])
+def test_tts_cache_work_runs_off_the_event_loop(client, tts, monkeypatch, url):
+    seen = []
+    record_threads(monkeypatch, asgi.wsgi.tts_cache, ('get', 'put', 'writer'), seen)
+    body = {'text': 'Off the loop please.', 'language': 'en'}
+
+    first = client.post(url, json=body)
+    second = client.post(url, json=body)
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content == b'Off the loop please. '
+    assert tts.calls == ['Off the loop please.']
+    assert seen and not any(loop for _, loop in seen)
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def ainvoke(self, prompt):
+        self.calls.append(prompt)
+        return types.SimpleNamespace(content=self.reply)
+
+    async def astream(self, prompt):
+        self.calls.append(prompt)
+        for word in self.reply.split(' '):
+            yield types.SimpleNamespace(content=word + ' ')
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM('A short summary.')
+    monkeypatch.setattr(asgi.wsgi, 'request_llm', lambda: fake)
+    return fake
+
+
+@pytest.mark.parametrize('url', ['/api/process', '/api/process?stream=1'])
+def test_llm_cache_work_runs_off_the_event_loop(client, llm, monkeypatch, url):
+    seen = []
+    record_threads(monkeypatch, asgi.wsgi.llm_cache, ('get', 'set'), seen)
+    body = {'text': f'Notes for {url}', 'language': 'en'}
+
+    for _ in range(2):
+        assert client.post(url, json=body).status_code == 200
+    assert len(llm.calls) == 1
+    assert ('set', False) in seen
+    assert seen and not any(loop for _, loop in seen)
+
+
+class BlockingLLM:
+    """Holds each call until a second caller has joined it."""
+
+    def __init__(self, joined):
+        self.joined = joined
+        self.started = threading.Event()
+        self.calls = []
+
+    def invoke(self, prompt):
+        self.calls.append(prompt)
+        self.started.set()
+        self.joined.wait(2)
+        return types.SimpleNamespace(content='shared')
+
+    async def ainvoke(self, prompt):
+        self.calls.append(prompt)
+        self.started.set()
+        await run_in_threadpool(self.joined.wait, 2)
+        return types.SimpleNamespace(content='shared')
+
+
+@pytest.fixture
+def blocking_llm(monkeypatch):
+    joined = threading.Event()
+    record_coalesced = asgi.wsgi.llm_cache.record_coalesced
+
+    def join():
+        record_coalesced()
+        joined.set()
+
+    monkeypatch.setattr(asgi.wsgi.llm_cache, 'record_coalesced', join)
+    fake = BlockingLLM(joined)
+    monkeypatch.setattr(asgi.wsgi, 'request_llm', lambda: fake)
+    return fake
+
+
+def test_native_route_joins_a_flask_call_in_flight(blocking_llm):
+    prompt = 'Joined from the event loop'
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(asgi.wsgi.llm_complete, prompt)
+        assert blocking_llm.started.wait(2)
+        assert asyncio.run(asgi.llm_complete(prompt)) == 'shared'
+        assert leader.result(2) == 'shared'
+    assert blocking_llm.calls == [prompt]
+
+
+def test_flask_joins_a_native_route_call_in_flight(blocking_llm):
+    prompt = 'Joined from a worker thread'
+
+    async def lead():
+        leader = asyncio.ensure_future(asgi.llm_complete(prompt))
+        while not blocking_llm.started.is_set():
+            await asyncio.sleep(0.01)
+        follower = run_in_threadpool(asgi.wsgi.llm_complete, prompt)
+        return await asyncio.gather(leader, follower)
+
+    assert asyncio.run(lead()) == ['shared', 'shared']
+    assert blocking_llm.calls == [prompt]
+
+
+def test_native_stream_joins_a_call_in_flight(blocking_llm):
+    text = 'Streamed while the same prompt is in flight.'
+    prompt = asgi.wsgi.build_prompt('summarize', 'en', text)
+
+    async def collect():
+        return [token async for token in asgi.token_stream(text, 'en', 'summarize')]
+
+    with ThreadPoolExecutor(1) as pool:
+        leader = pool.submit(asgi.wsgi.llm_complete, prompt)
+        assert blocking_llm.started.wait(2)
+        assert asyncio.run(collect()) == ['shared']
+        assert leader.result(2) == 'shared'
+    assert blocking_llm.calls == [prompt]
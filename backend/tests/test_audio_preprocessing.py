@@ -0,0 +1,205 @@
+import io
+import wave
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import audio_preprocessing
+from audio_preprocessing import (
+    FRAME_SECONDS, KEPT_PAUSE_SECONDS, TARGET_SAMPLE_RATE, TimeMap, _segment_map, decode, kept_spans,
+    prepare_audio, resample, segment_bounds, speech_frames, stitch
+)
+
+RATE = TARGET_SAMPLE_RATE
+
+
+def tone(seconds, rate, frequency=440.0, amplitude=0.5):
+    return (amplitude * np.sin(2 * np.pi * frequency * np.arange(int(seconds * rate)) / rate)).astype(np.float32)
+
+
+def noise(seconds, rate, seed=0, amplitude=0.3):
+    return np.random.default_rng(seed).uniform(-amplitude, amplitude, int(seconds * rate)).astype(np.float32)
+
+
+def silence(seconds, rate):
+    return np.zeros(int(seconds * rate), dtype=np.float32)
+
+
+def wav_bytes(samples, rate, channels=1):
+    frames = np.repeat(samples[:, None], channels, axis=1) if channels > 1 else samples
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        writer.writeframes((np.clip(frames, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def decoded(segment):
+    return decode(segment.data, segment.mimetype)
+
+
+def test_speech_must_beat_the_floor_and_the_dynamic_range():
+    pad = int(audio_preprocessing.SPEECH_PAD_SECONDS / FRAME_SECONDS)
+    levels = np.array([-80.0] * 20 + [-20.0] * 10 + [-80.0] * 20)
+    voiced = speech_frames(levels)
+    assert np.flatnonzero(voiced).tolist() == list(range(20 - pad, 30 + pad))
+
+    # Background above the floor but more than the dynamic range below the loudest frames is silence
+    levels = np.array([-48.0] * 20 + [-10.0] * 20 + [-48.0] * 20)
+    assert np.flatnonzero(speech_frames(levels)).tolist() == list(range(20 - pad, 40 + pad))
+
+    # A quiet recording is all silence once it is under the absolute floor
+    assert not speech_frames(np.full(30, -60.0)).any()
+    assert speech_frames(np.zeros(0)).tolist() == []
+
+
+def test_kept_spans_trim_the_ends_and_shorten_long_pauses():
+    long_pause = int(2 * audio_preprocessing.MAX_PAUSE_SECONDS / FRAME_SECONDS)
+    voiced = np.array([False] * 10 + [True] * 10 + [False] * 5 + [True] * 10 + [False] * long_pause + [True] * 10 + [False] * 10)
+    second_start = 35 + long_pause
+
+    spans = kept_spans(voiced, 1, len(voiced))
+    assert len(spans) == 2
+    (first_start, first_end), (last_start, last_end) = spans
+    # The short pause stays, the leading and trailing silence goes
+    assert (first_start, last_end) == (10, second_start + 10)
+    kept_pause = (first_end - 35) + (second_start - last_start)
+    assert abs(kept_pause - KEPT_PAUSE_SECONDS / FRAME_SECONDS) <= 2
+
+
+def test_kept_spans_give_the_last_partial_frame_to_the_final_span():
+    assert kept_spans(np.array([False, True, True]), 10, 35) == [(10, 35)]
+
+
+def test_resample_averages_integer_ratios():
+    samples, rate = resample(np.arange(12, dtype=np.float32), 48000)
+    assert rate == RATE
+    assert samples.tolist() == [1.0, 4.0, 7.0, 10.0]
+
+
+def test_resample_interpolates_fractional_ratios():
+    original = tone(1, 44100)
+    samples, rate = resample(original, 44100)
+    assert rate == RATE
+    assert len(samples) == RATE
+    assert samples.dtype == np.float32
+    # A 440 Hz tone survives the low-pass
+    assert np.sqrt(np.mean(np.square(samples))) == pytest.approx(np.sqrt(np.mean(np.square(original))), rel=0.05)
+
+
+def test_resample_leaves_low_rates_alone():
+    samples = tone(0.1, 8000)
+    resampled, rate = resample(samples, 8000)
+    assert rate == 8000
+    assert resampled is samples
+
+
+def test_stereo_48k_is_downmixed_resampled_and_trimmed():
+    audio = np.concatenate([silence(0.5, 48000), tone(1, 48000), silence(0.5, 48000)])
+    segments = prepare_audio(wav_bytes(audio, 48000, channels=2))
+
+    assert len(segments) == 1
+    samples, rate = decoded(segments[0])
+    assert rate == RATE
+    assert samples.shape[1] == 1
+    # One second of speech plus at most the padding on either side
+    pad = audio_preprocessing.SPEECH_PAD_SECONDS
+    assert RATE <= len(samples) <= (1 + 2 * pad + 2 * FRAME_SECONDS) * RATE
+
+    _, _, words = stitch(segments, [{'transcript': 'hello', 'confidence': 0.9, 'words': [
+        {'word': 'hello', 'start': 0.0, 'end': len(samples) / RATE}
+    ]}])
+    # The kept audio starts just before the tone at 0.5s and ends just after it at 1.5s
+    assert 0.5 - pad - FRAME_SECONDS <= words[0]['start'] <= 0.5
+    assert 1.5 <= words[0]['end'] <= 1.5 + pad + FRAME_SECONDS
+
+
+def test_44k_audio_is_resampled_to_16k():
+    segments = prepare_audio(wav_bytes(tone(1, 44100), 44100))
+    assert len(segments) == 1
+    samples, rate = decoded(segments[0])
+    assert rate == RATE
+    assert samples.shape[1] == 1
+    assert abs(len(samples) - RATE) <= FRAME_SECONDS * RATE
+
+
+def test_all_silent_audio_has_no_segments():
+    assert prepare_audio(wav_bytes(silence(2, 48000), 48000, channels=2)) == []
+
+
+def test_audio_shorter_than_one_frame_has_no_segments():
+    assert prepare_audio(wav_bytes(tone(FRAME_SECONDS / 3, RATE), RATE)) == []
+
+
+def test_segment_cuts_go_at_the_quietest_frame(monkeypatch):
+    monkeypatch.setattr(audio_preprocessing, 'SEGMENT_SECONDS', 1)
+    frame = int(FRAME_SECONDS * RATE)
+    samples = tone(2.5, RATE)
+    # The search window is the last half second before the one-second limit
+    gap = RATE // 2 + 10 * frame
+    samples[gap:gap + frame] = 0
+
+    bounds = segment_bounds(samples, RATE)
+    assert bounds[0] == (0, gap)
+    assert [start for start, _ in bounds[1:]] == [end for _, end in bounds[:-1]]
+    assert bounds[-1][1] == len(samples)
+    assert all(0 < end - start <= RATE for start, end in bounds)
+
+
+def test_segment_map_offsets_spans_that_start_before_the_segment():
+    spans = [(0, 4800), (16000, 40000)]
+    time_map = _segment_map(spans, 8000, 24000, RATE)
+    assert time_map(0.2) == 1.0
+    assert time_map(0.6) == 2.6
+    # Spans after the segment are left out
+    assert _segment_map(spans + [(24000, 64000)], 8000, 24000, RATE)(1.0) == 3.0
+
+
+def test_segment_times_map_back_to_the_original(monkeypatch):
+    monkeypatch.setattr(audio_preprocessing, 'SEGMENT_SECONDS', 1)
+    original = np.concatenate([
+        silence(0.5, RATE), noise(0.7, RATE, seed=1), silence(1.5, RATE), noise(0.7, RATE, seed=2), silence(0.5, RATE)
+    ])
+    # Compare against the 16-bit samples the WAV actually holds
+    original = np.round(original * 32767) / 32767
+    segments = prepare_audio(wav_bytes(original, RATE))
+
+    assert len(segments) > 1
+    kept = 0
+    step = RATE // 1000
+    for segment in segments:
+        samples, rate = decoded(segment)
+        assert rate == RATE
+        assert len(samples) <= RATE
+        kept += len(samples)
+        # Every kept millisecond maps onto the same audio in the original
+        for start in range(0, len(samples) - step, step):
+            mapped = int(round(segment.time_map(start / RATE) * RATE))
+            assert np.allclose(samples[start:start + step, 0], original[mapped:mapped + step], atol=1e-3)
+    # All the speech is kept; most of the leading and trailing silence and the long pause is not
+    assert 1.4 * RATE < kept < len(original) - 1.2 * RATE
+
+
+def test_stitch_maps_words_and_weights_confidence():
+    segments = [
+        audio_preprocessing.AudioSegment(b'', 'audio/wav', TimeMap([(0.0, 0.5)])),
+        audio_preprocessing.AudioSegment(b'', 'audio/wav', TimeMap([(0.0, 3.0), (1.0, 5.0)])),
+    ]
+    alternatives = [
+        {'transcript': ' first ', 'confidence': 0.5, 'words': [{'word': 'first', 'start': 0.1, 'end': 0.4}]},
+        {'transcript': 'second third', 'confidence': 1.0, 'words': [
+            {'word': 'second', 'start': 0.2, 'end': 0.6},
+            {'word': 'third', 'start': 1.25, 'end': 1.5},
+        ]},
+    ]
+
+    transcript, confidence, words = stitch(segments, alternatives)
+    assert transcript == 'first second third'
+    assert confidence == pytest.approx((0.5 + 2 * 1.0) / 3)
+    assert [(w['word'], w['start'], w['end']) for w in words] == [
+        ('first', 0.6, 0.9), ('second', 3.2, 3.6), ('third', 5.25, 5.5)
+    ]
+    assert stitch(segments, [alternatives[0], None]) is None
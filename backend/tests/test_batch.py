@@ -0,0 +1,60 @@
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+import app as wsgi
+from tts_cache import AudioCache
+
+
+@pytest.fixture
+def client():
+    return wsgi.app.test_client()
+
+
+def read_zip(response):
+    archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    return archive, json.loads(archive.read('manifest.json'))['items']
+
+
+def test_malformed_process_items_fail_on_their_own(client):
+    response = client.post('/api/process/batch', json={'items': [
+        {'text': 'hi', 'language': ['en']},
+        {'text': 'hi', 'type': {'kind': 'summarize'}},
+    ]})
+    assert response.status_code == 200
+    assert [r['error'] for r in response.get_json()['results']] == [
+        'language must be a string', 'type must be a string'
+    ]
+
+
+def test_malformed_tts_items_fail_on_their_own(client, monkeypatch):
+    monkeypatch.setattr(wsgi, 'synthesize', lambda text, voice_id: b'audio for ' + text.encode())
+    response = client.post('/api/tts/batch', json={'items': [
+        {'text': 'hi', 'voice_id': 123},
+        {'text': 'hi', 'language': ['en']},
+        {'text': 'batch item that works'},
+    ]})
+    assert response.status_code == 200
+    archive, manifest = read_zip(response)
+    assert [item.get('error') for item in manifest] == ['voice_id must be a string', 'language must be a string', None]
+    assert archive.read(manifest[2]['file']) == b'audio for batch item that works'
+
+
+def test_evicted_tts_file_is_reported_in_the_manifest(client, monkeypatch, tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1024 * 1024, hot_max_bytes=1024, hot_item_max_bytes=4)
+
+    def evicted(text, voice_id):
+        entry = cache.put(AudioCache.make_key(text, voice_id, wsgi.TTS_MODEL), b'audio for ' + text.encode())
+        if text == 'evicted item':
+            os.unlink(entry.path)
+        return entry
+
+    monkeypatch.setattr(wsgi, 'get_cached_tts', evicted)
+    response = client.post('/api/tts/batch', json={'items': [{'text': 'evicted item'}, {'text': 'kept item'}]})
+    assert response.status_code == 200
+    archive, manifest = read_zip(response)
+    assert 'Text-to-speech conversion failed' in manifest[0]['error']
+    assert archive.read(manifest[1]['file']) == b'audio for kept item'
@@ -0,0 +1,28 @@
+import pytest
+
+import app as wsgi
+import metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(wsgi, 'PROFILER_ENABLED', True)
+    return wsgi.app.test_client()
+
+
+@pytest.mark.parametrize('interval_ms', ['-5', '0', 'nan', 'inf'])
+def test_rejects_intervals_that_are_not_positive(client, interval_ms):
+    response = client.get(f'/debug/profile?seconds=1&interval_ms={interval_ms}')
+    assert response.status_code == 400
+
+
+def test_clamps_the_interval_to_a_millisecond(client, monkeypatch):
+    calls = []
+
+    def profile(seconds, interval):
+        calls.append((seconds, interval))
+        return ''
+
+    monkeypatch.setattr(metrics, 'profile', profile)
+    assert client.get('/debug/profile?seconds=0.5&interval_ms=0.01').status_code == 200
+    assert calls == [(0.5, 0.001)]
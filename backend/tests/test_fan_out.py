@@ -0,0 +1,54 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import iter_concurrent
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_yields_in_input_order_with_a_bounded_window(pool):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def work(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        # Later items finish first, so completion order is the reverse of input order
+        time.sleep(0.01 * (6 - item))
+        with lock:
+            running[0] -= 1
+        return item * 10
+
+    assert list(iter_concurrent(work, range(6), 2, pool)) == [0, 10, 20, 30, 40, 50]
+    assert peak[0] == 2
+
+
+def test_close_cancels_work_that_has_not_started():
+    pool = ThreadPoolExecutor(1)
+    running, release = threading.Event(), threading.Event()
+    started = []
+
+    def work(item):
+        started.append(item)
+        if item == 1:
+            running.set()
+            release.wait(2)
+        return item
+
+    results = iter_concurrent(work, range(5), 3, pool)
+    # Items 0-2 are submitted before the first result; once 1 is running, 2 is still queued
+    assert next(results) == 0
+    assert running.wait(2)
+    results.close()
+    release.set()
+    pool.shutdown(wait=True)
+    assert started == [0, 1]
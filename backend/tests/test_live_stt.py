@@ -0,0 +1,73 @@
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+from live_stt import FakeLiveBackend
+from scheduler import ProviderLimiter
+
+URL = '/ws/stt?language=en&encoding=linear16&sample_rate=16000'
+WORD = 3200
+
+
+@pytest.fixture
+def live_sessions(monkeypatch):
+    limiter = ProviderLimiter('deepgram_live', 1, max_queue={'interactive': 0, 'batch': 0})
+    monkeypatch.setitem(asgi.wsgi.scheduler.limiters, 'deepgram_live', limiter)
+    return limiter
+
+
+@pytest.fixture
+def client(monkeypatch, live_sessions):
+    # Two words per utterance, one word per 0.1 s of 16 kHz 16-bit audio
+    monkeypatch.setattr(asgi, 'live_backend', FakeLiveBackend(bytes_per_word=WORD, words_per_utterance=2))
+    with TestClient(asgi.application) as client:
+        yield client
+
+
+def test_streams_interim_final_and_closed_events(client):
+    with client.websocket_connect(URL) as ws:
+        ws.send_bytes(b'\0' * WORD)
+        interim = ws.receive_json()
+        assert interim['type'] == 'interim'
+        assert interim['text'] == 'word1'
+        assert not interim['speech_final']
+
+        ws.send_bytes(b'\0' * WORD)
+        final = ws.receive_json()
+        assert final['type'] == 'final'
+        assert final['text'] == 'word1 word2'
+        assert final['speech_final']
+        assert [w['word'] for w in final['words']] == ['word1', 'word2']
+        assert (final['start'], final['end']) == (0.0, 0.2)
+
+        ws.send_bytes(b'\0' * WORD)
+        assert ws.receive_json()['type'] == 'interim'
+        ws.send_json({'type': 'stop'})
+        flushed = ws.receive_json()
+        assert (flushed['type'], flushed['text']) == ('final', 'word3')
+        assert ws.receive_json() == {'type': 'closed'}
+
+
+def test_session_holds_a_live_slot_until_closed(client, live_sessions):
+    with client.websocket_connect(URL) as ws:
+        ws.send_bytes(b'\0' * WORD)
+        ws.receive_json()
+        assert live_sessions.stats()['in_use'] == 1
+        # Prerecorded transcription keeps its own slots
+        assert asgi.wsgi.scheduler.stats()['deepgram']['in_use'] == 0
+
+        # The only slot is taken and nobody may queue, so a second session is turned away
+        with client.websocket_connect(URL) as rejected:
+            assert rejected.receive_json()['type'] == 'error'
+            assert rejected.receive()['code'] == 1013
+
+        ws.send_json({'type': 'stop'})
+        while ws.receive_json()['type'] != 'closed':
+            pass
+    assert live_sessions.stats()['in_use'] == 0
+
+
+def test_rejects_unsupported_language(client):
+    with client.websocket_connect('/ws/stt?language=xx') as ws:
+        assert ws.receive_json() == {'type': 'error', 'error': 'Unsupported language'}
+        assert ws.receive()['code'] == 1008
@@ -0,0 +1,170 @@
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import llm_cache
+from llm_cache import MemoryBackend, ResponseCache, SQLiteBackend, TieredBackend, create_backend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite', 'tiered'])
+def test_entries_expire_after_their_ttl(tmp_path, clock, kind):
+    cache = ResponseCache(create_backend(kind, str(tmp_path / 'llm.sqlite3'), 10, 60), 60)
+    cache.set('key', 'value')
+    clock[0] += 59
+    assert cache.get('key') == 'value'
+    clock[0] += 2
+    assert cache.get('key') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_memory_backend_evicts_the_least_recently_used(clock):
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', '1', 60)
+    backend.set('b', '2', 60)
+    assert backend.get('a') == '1'
+    backend.set('c', '3', 60)
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == ('1', None, '3')
+
+
+def test_sqlite_backend_evicts_the_least_recently_used(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / 'llm.sqlite3'), max_entries=2)
+    backend.set('a', '1', 60)
+    clock[0] += 1
+    backend.set('b', '2', 60)
+    clock[0] += 1
+    assert backend.get('a') == '1'
+    clock[0] += 1
+    backend.set('c', '3', 60)
+    assert len(backend) == 2
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == ('1', None, '3')
+
+
+def test_sqlite_backend_drops_expired_entries_before_live_ones(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / 'llm.sqlite3'), max_entries=2)
+    backend.set('old', '1', 60)
+    clock[0] += 1
+    backend.set('short', '2', 1)
+    clock[0] += 5
+    backend.set('new', '3', 60)
+    assert (backend.get('old'), backend.get('new')) == ('1', '3')
+
+
+def test_sqlite_backend_survives_a_restart(tmp_path, clock):
+    path = str(tmp_path / 'llm.sqlite3')
+    backend = SQLiteBackend(path)
+    backend.set('kept', 'value', 60)
+    backend.set('expiring', 'value', 10)
+    backend._db.close()
+
+    clock[0] += 30
+    restarted = SQLiteBackend(path)
+    assert restarted.get('kept') == 'value'
+    # Expired rows are pruned when the file is opened
+    assert len(restarted) == 1
+
+
+def test_tiered_backend_backfills_the_faster_tiers(tmp_path, clock):
+    memory = MemoryBackend()
+    sqlite = SQLiteBackend(str(tmp_path / 'llm.sqlite3'))
+    backend = TieredBackend(memory, sqlite, backfill_ttl=30)
+    assert backend.name == 'memory+sqlite'
+
+    sqlite.set('key', 'value', 3600)
+    assert memory.get('key') is None
+    assert backend.get('key') == 'value'
+    assert memory.get('key') == 'value'
+
+    # The backfilled copy has the backfill TTL; the lower tier still has the entry after it expires
+    clock[0] += 31
+    assert memory.get('key') is None
+    assert backend.get('key') == 'value'
+
+
+def test_tiered_backend_writes_every_tier(tmp_path, clock):
+    memory = MemoryBackend()
+    sqlite = SQLiteBackend(str(tmp_path / 'llm.sqlite3'))
+    TieredBackend(memory, sqlite).set('key', 'value', 60)
+    assert memory.get('key') == sqlite.get('key') == 'value'
+
+
+@pytest.fixture
+def following(monkeypatch):
+    """Set once a caller starts waiting for another caller's flight."""
+    event = threading.Event()
+
+    def wait_result(future, provider=None):
+        event.set()
+        return future.result(timeout=2)
+
+    # ResponseCache hands wait_result to its SingleFlight when it is created
+    monkeypatch.setattr(llm_cache, 'wait_result', wait_result)
+    return event
+
+
+def test_concurrent_misses_share_one_call(following):
+    cache = ResponseCache(MemoryBackend(), 60)
+    calls = []
+
+    def complete():
+        calls.append(1)
+        assert following.wait(2)
+        return 'shared answer'
+
+    with ThreadPoolExecutor(2) as pool:
+        results = [pool.submit(cache.get_or_compute, 'key', complete) for _ in range(2)]
+        assert [result.result(2) for result in results] == ['shared answer'] * 2
+
+    assert calls == [1]
+    assert cache.get_or_compute('key', complete) == 'shared answer'
+    assert calls == [1]
+    assert cache.stats()['coalesced'] == 1
+
+
+def test_failures_reach_every_caller_and_are_not_cached(following):
+    cache = ResponseCache(MemoryBackend(), 60)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        assert following.wait(2)
+        raise RuntimeError('upstream failed')
+
+    with ThreadPoolExecutor(2) as pool:
+        results = [pool.submit(cache.get_or_compute, 'key', fail) for _ in range(2)]
+        for result in results:
+            with pytest.raises(RuntimeError, match='upstream failed'):
+                result.result(2)
+
+    assert calls == [1]
+    assert cache.flights.pending('key') is None
+    assert cache.get_or_compute('key', lambda: 'retried') == 'retried'
+
+
+def test_wait_pending_joins_a_call_in_flight(following):
+    cache = ResponseCache(MemoryBackend(), 60)
+    started, release = threading.Event(), threading.Event()
+
+    def complete():
+        started.set()
+        release.wait(2)
+        return 'answer'
+
+    assert cache.wait_pending('key') is None
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(cache.get_or_compute, 'key', complete)
+        assert started.wait(2)
+        follower = pool.submit(cache.wait_pending, 'key')
+        assert following.wait(2)
+        release.set()
+        assert leader.result(2) == follower.result(2) == 'answer'
+    assert cache.stats()['coalesced'] == 1
@@ -0,0 +1,115 @@
+import json
+import types
+
+import pytest
+
+import app as wsgi
+from scheduler import DeadlineExceeded
+
+
+class FakeStreamingLLM:
+    """stream() yields the given tokens; an exception among them is raised in its place."""
+
+    def __init__(self, *tokens):
+        self.tokens = tokens
+        self.prompts = []
+        self.closed = False
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        try:
+            for token in self.tokens:
+                if isinstance(token, Exception):
+                    raise token
+                yield types.SimpleNamespace(content=token)
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def client():
+    return wsgi.app.test_client()
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    def install(fake):
+        monkeypatch.setattr(wsgi, 'request_llm', lambda: fake)
+        return fake
+
+    return install
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def stream(client, text, **body):
+    return client.post('/api/process?stream=1', json={'text': text, 'language': 'en', **body})
+
+
+def test_tokens_are_followed_by_the_result(client, stub_llm):
+    llm = stub_llm(FakeStreamingLLM('A short', '', ' summary.'))
+    response = stream(client, 'Text for the token events', type='summarize')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = parse_events(response.get_data(as_text=True))
+    # Empty chunks are not sent
+    assert events[:-1] == [('token', {'text': 'A short'}), ('token', {'text': ' summary.'})]
+
+    event, done = events[-1]
+    assert event == 'done'
+    assert isinstance(done.pop('elapsed_ms'), int)
+    assert done == {
+        'original_text': 'Text for the token events',
+        'processed_text': 'A short summary.',
+        'language': 'en',
+        'language_name': wsgi.SUPPORTED_LANGUAGES['en']['name'],
+        'language_flag': wsgi.SUPPORTED_LANGUAGES['en']['flag'],
+        'processing_type': 'summarize',
+    }
+    assert len(llm.prompts) == 1
+    assert llm.closed
+
+
+def test_a_failure_mid_stream_ends_with_an_error_event(client, stub_llm):
+    llm = stub_llm(FakeStreamingLLM('Partial', RuntimeError('connection reset')))
+    response = stream(client, 'Text for the error event')
+
+    assert response.status_code == 200
+    assert parse_events(response.get_data(as_text=True)) == [
+        ('token', {'text': 'Partial'}),
+        ('error', {'error': 'Text processing failed: connection reset'}),
+    ]
+    assert llm.closed
+
+
+def test_a_deadline_mid_stream_carries_its_status(client, stub_llm):
+    stub_llm(FakeStreamingLLM('Partial', DeadlineExceeded('openai')))
+    response = stream(client, 'Text for the deadline event')
+
+    event, data = parse_events(response.get_data(as_text=True))[-1]
+    assert event == 'error'
+    assert data['status'] == 504
+    assert data['retry_after'] is None
+
+
+def test_disconnecting_closes_the_upstream_stream(client, stub_llm):
+    llm = stub_llm(FakeStreamingLLM('First', ' second', ' third'))
+    text = 'Text for the disconnect'
+    response = client.post('/api/process?stream=1', json={'text': text, 'language': 'en'}, buffered=False)
+
+    events = iter(response.response)
+    assert parse_events(next(events).decode()) == [('token', {'text': 'First'})]
+    assert not llm.closed
+    response.close()
+
+    assert llm.closed
+    # A cut-off completion is not cached
+    assert wsgi.llm_cache.get(wsgi.llm_cache_key(wsgi.build_prompt('summarize', 'en', text))) is None
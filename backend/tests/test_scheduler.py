@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+import scheduler
+from scheduler import DeadlineExceeded, Overloaded, ProviderLimiter, set_request_policy
+
+
+def run_as(priority, deadline_ms, fn, *args):
+    """Runs fn in its own request context, as the servers do for each request."""
+    def run():
+        set_request_policy(priority, deadline_ms)
+        return fn(*args)
+    return contextvars.copy_context().run(run)
+
+
+def hold(limiter):
+    """Takes a slot and returns the context manager that gives it back."""
+    held = limiter.slot()
+    held.__enter__()
+    return held
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_interactive_waiters_go_before_batch():
+    limiter = ProviderLimiter('test', 1)
+    held = hold(limiter)
+    order = []
+
+    def call(priority):
+        with limiter.slot():
+            order.append(priority)
+
+    threads = []
+    for priority in ('batch', 'interactive'):
+        thread = threading.Thread(target=run_as, args=(priority, None, call, priority))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: limiter.stats()['queued'][priority] == 1)
+
+    held.__exit__(None, None, None)
+    for thread in threads:
+        thread.join()
+    assert order == ['interactive', 'batch']
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_full_queue_is_overloaded():
+    limiter = ProviderLimiter('test', 1, max_queue={'interactive': 0, 'batch': 0})
+    held = hold(limiter)
+    with pytest.raises(Overloaded) as rejected:
+        with limiter.slot():
+            pass
+    assert rejected.value.retry_after >= 1
+    held.__exit__(None, None, None)
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_queue_timeout_without_deadline_is_overloaded():
+    limiter = ProviderLimiter('test', 1, queue_timeout=0.05)
+    held = hold(limiter)
+    with pytest.raises(Overloaded):
+        with limiter.slot():
+            pass
+    assert limiter.stats()['queued'] == {'interactive': 0, 'batch': 0}
+    held.__exit__(None, None, None)
+
+
+def test_deadline_while_queued_is_exceeded():
+    limiter = ProviderLimiter('test', 1)
+    held = hold(limiter)
+
+    def call():
+        with limiter.slot():
+            pass
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        run_as('interactive', 50, call)
+    assert time.monotonic() - started < 1
+    assert limiter.stats()['queued'] == {'interactive': 0, 'batch': 0}
+    held.__exit__(None, None, None)
+
+
+def test_expired_deadline_is_refused_before_taking_a_slot():
+    limiter = ProviderLimiter('test', 1)
+
+    def call():
+        time.sleep(0.01)
+        with limiter.slot():
+            pass
+
+    with pytest.raises(DeadlineExceeded):
+        run_as('interactive', 1, call)
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_failure_after_the_deadline_is_exceeded():
+    limiter = ProviderLimiter('test', 1)
+
+    def call():
+        with limiter.slot():
+            time.sleep(0.06)
+            raise TimeoutError("upstream read timed out")
+
+    with pytest.raises(DeadlineExceeded):
+        run_as('interactive', 50, call)
+    with pytest.raises(TimeoutError):
+        run_as('interactive', None, call)
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_waiter_granted_as_it_times_out_keeps_the_slot(monkeypatch):
+    limiter = ProviderLimiter('test', 1)
+    held = hold(limiter)
+
+    def wait(waiter, timeout):
+        # The holder hands its slot to this waiter just as the wait times out
+        held.__exit__(None, None, None)
+        return False
+
+    monkeypatch.setattr(scheduler._Waiter, 'wait', wait)
+    with limiter.slot():
+        assert limiter.stats()['in_use'] == 1
+    assert limiter.stats()['in_use'] == 0
+    assert limiter.stats()['queued'] == {'interactive': 0, 'batch': 0}
+
+
+def test_async_waiter_granted_as_it_times_out_keeps_the_slot(monkeypatch):
+    limiter = ProviderLimiter('test', 1)
+
+    async def wait_async(waiter, timeout):
+        held.__exit__(None, None, None)
+        return False
+
+    async def call():
+        async with limiter.aslot():
+            assert limiter.stats()['in_use'] == 1
+
+    held = hold(limiter)
+    monkeypatch.setattr(scheduler._Waiter, 'wait_async', wait_async)
+    asyncio.run(call())
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_cancelled_async_waiter_hands_back_a_granted_slot():
+    limiter = ProviderLimiter('test', 1)
+
+    async def call():
+        held = hold(limiter)
+        task = asyncio.ensure_future(limiter.aslot().__aenter__())
+        await asyncio.sleep(0.01)
+        assert limiter.stats()['queued']['interactive'] == 1
+        # Granted, then cancelled before the waiter wakes up to see it
+        held.__exit__(None, None, None)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(call())
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_trickling_stream_is_cut_off_at_the_deadline():
+    closed = []
+
+    def trickle():
+        try:
+            while True:
+                time.sleep(0.02)
+                yield b'chunk'
+        finally:
+            closed.append(True)
+
+    def read():
+        return b''.join(scheduler.until_deadline(trickle(), 'test'))
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        run_as('interactive', 100, read)
+    assert time.monotonic() - started < 1
+    assert closed == [True]
+
+
+def test_async_trickling_stream_is_cut_off_at_the_deadline():
+    closed = []
+
+    async def trickle():
+        try:
+            while True:
+                await asyncio.sleep(0.02)
+                yield b'chunk'
+        finally:
+            closed.append(True)
+
+    async def read():
+        set_request_policy('interactive', 100)
+        return b''.join([chunk async for chunk in scheduler.auntil_deadline(trickle(), 'test')])
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(read())
+    assert closed == [True]
+
+
+def test_rate_limit_wait_does_not_hold_a_slot():
+    limiter = ProviderLimiter('test', 1, rate=100, burst_seconds=0.1, queue_timeout=1)
+    entered = threading.Event()
+
+    def expensive():
+        # 10 tokens in the bucket, so 20 more take 0.2 s to refill
+        with limiter.slot(30):
+            entered.set()
+
+    thread = threading.Thread(target=expensive)
+    thread.start()
+    wait_for(lambda: limiter.stats()['rate_available'] < 0)
+    # The rate-limited caller is still waiting, but the only slot is free for others
+    with limiter.slot():
+        assert not entered.is_set()
+    thread.join()
+    assert entered.is_set()
+    assert limiter.stats()['in_use'] == 0
+
+
+def test_rate_limit_wait_past_the_queue_timeout_is_overloaded():
+    limiter = ProviderLimiter('test', 1, rate=10, burst_seconds=1, queue_timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as rejected:
+        with limiter.slot(30):
+            pass
+    assert time.monotonic() - started < 0.1
+    assert rejected.value.retry_after == 2
+    # The refused call's tokens are handed back
+    assert limiter.stats()['rate_available'] == pytest.approx(10, abs=0.5)
+    assert limiter.stats()['in_use'] == 0
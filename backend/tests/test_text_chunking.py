@@ -0,0 +1,35 @@
+from text_chunking import chunk_by_tokens, estimate_tokens, join_chunks, split_sentences
+
+PARAGRAPHS = [
+    "The quarterly review covered onboarding. Support volume grew again! Did the roadmap change?",
+    "Customers asked for faster replies; clearer summaries too. Long calls were the main complaint.",
+    "Latency is measured at every stage: upload, transcription, generation and synthesis.",
+]
+TEXT = "\n\n".join(PARAGRAPHS)
+
+
+def test_chunks_without_overlap_join_back_to_the_text():
+    chunks = chunk_by_tokens(TEXT, 12)
+    assert len(chunks) > len(PARAGRAPHS)
+    assert all(estimate_tokens(chunk.text) <= 12 for chunk in chunks)
+    assert join_chunks(chunks, [chunk.text for chunk in chunks]) == TEXT
+
+
+def test_run_on_sentences_are_split_at_words_and_still_join_back():
+    text = " ".join(f"word{i}" for i in range(60)) + "."
+    chunks = chunk_by_tokens(text, 10)
+    assert len(chunks) > 1
+    assert join_chunks(chunks, [chunk.text for chunk in chunks]) == text
+
+
+def test_overlap_repeats_the_previous_chunks_last_sentences():
+    chunks = chunk_by_tokens(TEXT, 30, overlap_tokens=10)
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.text.startswith(split_sentences(previous.text)[-1])
+
+
+def test_join_strips_outputs_and_keeps_the_original_separators():
+    chunks = chunk_by_tokens(TEXT, 25)
+    outputs = [f"  {chunk.text.upper()}\n" for chunk in chunks]
+    assert join_chunks(chunks, outputs) == TEXT.upper()
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+from tts_cache import AudioCache
+
+
+def make_cache(directory, max_bytes=1024, hot_max_bytes=1024, hot_item_max_bytes=64):
+    return AudioCache(str(directory), max_bytes, hot_max_bytes, hot_item_max_bytes)
+
+
+def test_second_hit_returns_the_same_audio(tmp_path):
+    cache = make_cache(tmp_path)
+    key = AudioCache.make_key("Hello there.", "voice", "model")
+    calls = []
+
+    def synthesize():
+        calls.append(key)
+        return b'mp3 audio bytes'
+
+    first = cache.get_or_create(key, synthesize)
+    second = cache.get_or_create(key, synthesize)
+    assert first.data == second.data == b'mp3 audio bytes'
+    assert calls == [key]
+    assert cache.stats()['hot_hits'] == 1
+
+
+def test_concurrent_misses_share_one_synthesis(tmp_path):
+    following = threading.Event()
+
+    def wait_shared(future):
+        following.set()
+        return future.result()
+
+    cache = AudioCache(str(tmp_path), 1024, 1024, wait_shared=wait_shared)
+    key = AudioCache.make_key("Shared sentence.", "voice", "model")
+    release = threading.Event()
+    calls = []
+
+    def synthesize():
+        calls.append(key)
+        release.wait(2)
+        return b'shared audio'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_create(key, synthesize))) for _ in range(2)]
+    threads[0].start()
+    while cache.flights.pending(key) is None:
+        time.sleep(0.001)
+    threads[1].start()
+    assert following.wait(2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [key]
+    assert [entry.data for entry in results] == [b'shared audio', b'shared audio']
+    assert cache.stats()['coalesced'] == 1
+
+
+def test_evicts_least_recently_used_by_bytes(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=250)
+    for name in ('a', 'b'):
+        cache.put(name * 64, name.encode() * 100)
+    # Touching 'a' makes 'b' the least recently used
+    assert cache.get('a' * 64) is not None
+    cache.put('c' * 64, b'c' * 100)
+
+    assert cache.get('b' * 64) is None
+    assert not os.path.exists(cache.path_for('b' * 64))
+    with open(cache.get('a' * 64).path, 'rb') as f:
+        assert f.read() == b'a' * 100
+    assert cache.stats()['disk_bytes'] == 200
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicted_entry_is_not_promoted_back_into_memory(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=150)
+    cache.put('a' * 64, b'a' * 100)
+    cache.put('b' * 64, b'b' * 100)
+    # A reader that loaded 'a' before it was evicted must not put it back in the hot tier
+    with cache._lock:
+        cache._promote('a' * 64, b'a' * 100)
+    assert cache.get('a' * 64) is None
+    assert cache.stats()['hot_bytes'] == 0
+
+
+def test_entries_survive_a_restart_and_stay_bounded(tmp_path):
+    cache = make_cache(tmp_path)
+    for index, name in enumerate('abc'):
+        entry = cache.put(name * 64, name.encode() * 300)
+        os.utime(entry.path, (1000 + index, 1000 + index))
+    # A write that was interrupted by the restart
+    with open(os.path.join(str(tmp_path), 'leftover.part'), 'wb') as f:
+        f.write(b'partial')
+
+    reloaded = make_cache(tmp_path, max_bytes=700)
+    assert reloaded.stats()['entries'] == 2
+    # The oldest entry by mtime is the one evicted
+    assert reloaded.get('a' * 64) is None
+    entry = reloaded.get('c' * 64)
+    with open(entry.path, 'rb') as f:
+        assert f.read() == b'c' * 300
+    assert not os.path.exists(os.path.join(str(tmp_path), 'leftover.part'))
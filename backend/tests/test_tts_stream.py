@@ -0,0 +1,93 @@
+import threading
+import time
+import types
+
+import pytest
+
+import app as wsgi
+
+
+class FakeTextToSpeech:
+    """Yields b'<text>:<n>' chunks; delay(text) says how long each segment takes."""
+
+    def __init__(self, delay=lambda text: 0, chunks=2):
+        self.delay = delay
+        self.chunks = chunks
+        self.calls = []
+        self.closed = []
+        self._lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def convert(self, voice_id, text, **kwargs):
+        with self._lock:
+            self.calls.append(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            for n in range(self.chunks):
+                time.sleep(self.delay(text))
+                yield f'{text}:{n} '.encode()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.closed.append(text)
+
+
+@pytest.fixture
+def stub_tts(monkeypatch):
+    monkeypatch.setattr(wsgi, 'TTS_STREAM_LOOKAHEAD', 2)
+
+    def install(fake):
+        monkeypatch.setattr(wsgi, 'el_client', types.SimpleNamespace(text_to_speech=fake))
+        return fake
+
+    return install
+
+
+def test_audio_comes_out_in_segment_order(stub_tts):
+    # Later segments finish first
+    fake = stub_tts(FakeTextToSpeech(delay=lambda text: 0.01 * (6 - int(text))))
+    segments = [str(i) for i in range(6)]
+
+    audio = b''.join(wsgi.stream_tts_segments(iter(segments), 'voice'))
+    assert audio == b''.join(f'{i}:0 {i}:1 '.encode() for i in segments)
+    assert sorted(fake.calls) == segments
+
+
+def test_no_more_than_the_lookahead_runs_at_once(stub_tts):
+    fake = stub_tts(FakeTextToSpeech(delay=lambda text: 0.01))
+
+    assert len(b''.join(wsgi.stream_tts_segments(iter(str(i) for i in range(8)), 'voice'))) > 0
+    assert len(fake.calls) == 8
+    assert fake.peak == wsgi.TTS_STREAM_LOOKAHEAD
+
+
+def test_closing_the_stream_starts_no_more_segments(stub_tts):
+    release = threading.Event()
+
+    def delay(text):
+        # Everything after the first segment is still running when the stream is closed
+        if text != '0':
+            release.wait(2)
+        return 0
+
+    fake = stub_tts(FakeTextToSpeech(delay))
+
+    stream = wsgi.stream_tts_segments(iter(str(i) for i in range(8)), 'voice')
+    assert next(stream) == b'0:0 '
+    stream.close()
+    release.set()
+
+    deadline = time.monotonic() + 2
+    while fake.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    # Only segments already inside the lookahead window were requested, and they were stopped
+    assert len(fake.calls) <= wsgi.TTS_STREAM_LOOKAHEAD
+    assert fake.running == 0
+    assert sorted(fake.closed) == sorted(fake.calls)
@@ -0,0 +1,153 @@
+import logging
+import re
+from collections import namedtuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("Nexus Voice AI")
+
+SENTENCE_END = re.compile(r'(?<=[.!?;:。！？])\s+')
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def split_sentences(text):
+    return [s for s in SENTENCE_END.split(text.strip()) if s]
+
+
+def _split_long(sentence, max_chars):
+    # Fall back to word boundaries for run-on sentences
+    parts, current = [], ''
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def sentence_segments(text, max_chars=250):
+    """Groups sentences into segments of at most max_chars characters.
+
+    The first sentence is always emitted on its own so the first segment is
+    as short as possible and playback can start early.
+    """
+    sentences = []
+    for sentence in split_sentences(text):
+        if len(sentence) > max_chars:
+            sentences.extend(_split_long(sentence, max_chars))
+        else:
+            sentences.append(sentence)
+    if not sentences:
+        return []
+
+    segments = [sentences[0]]
+    current = ''
+    for sentence in sentences[1:]:
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+class SentenceBuffer:
+    """Accumulates streamed tokens and releases complete sentences."""
+
+    def __init__(self):
+        self._text = ''
+
+    def feed(self, token):
+        self._text += token
+        parts = SENTENCE_END.split(self._text)
+        # The last part has no terminator + whitespace after it yet
+        self._text = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self):
+        rest, self._text = self._text.strip(), ''
+        return rest
+
+
+TextChunk = namedtuple('TextChunk', ['text', 'separator'])
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def token_counter(model):
+    """Returns a function counting tokens for model, or a length estimate without tiktoken."""
+    if tiktoken is None:
+        return estimate_tokens
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding for {model} unavailable ({e}); estimating token counts")
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _token_units(text, max_tokens, count_tokens):
+    # (text, separator that followed it, token count) per sentence
+    units = []
+    paragraphs = [p for p in PARAGRAPH_BREAK.split(text.strip()) if p.strip()]
+    for paragraph in paragraphs:
+        sentences = split_sentences(paragraph)
+        for i, sentence in enumerate(sentences):
+            separator = ' ' if i < len(sentences) - 1 else '\n\n'
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, separator, tokens))
+                continue
+            pieces = _split_long(sentence, max(1, len(sentence) * max_tokens // tokens))
+            for j, piece in enumerate(pieces):
+                units.append((piece, separator if j == len(pieces) - 1 else ' ', count_tokens(piece)))
+    return units
+
+
+def chunk_by_tokens(text, max_tokens, overlap_tokens=0, count_tokens=estimate_tokens):
+    """Splits text into chunks of roughly max_tokens at paragraph and sentence boundaries.
+
+    Each chunk starts with up to overlap_tokens worth of trailing sentences from
+    the previous chunk. The separator of a chunk is the whitespace that followed
+    it in the original text, so non-overlapping chunks can be reassembled in order.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for unit in _token_units(text, max_tokens, count_tokens):
+        if current and current_tokens + unit[2] > max_tokens:
+            chunks.append(current)
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                if carried_tokens + previous[2] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            current, current_tokens = carried, carried_tokens
+            while current and current_tokens + unit[2] > max_tokens:
+                current_tokens -= current.pop(0)[2]
+        current.append(unit)
+        current_tokens += unit[2]
+    if current:
+        chunks.append(current)
+
+    return [
+        TextChunk(''.join(u[0] + u[1] for u in units[:-1]) + units[-1][0], units[-1][1])
+        for units in chunks
+    ]
+
+
+def join_chunks(chunks, outputs):
+    return ''.join(
+        output.strip() + (chunk.separator if i < len(chunks) - 1 else '')
+        for i, (chunk, output) in enumerate(zip(chunks, outputs))
+    )
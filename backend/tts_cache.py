@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from single_flight import SingleFlight
+
+logger = logging.getLogger("Nexus Voice AI")
+
+
+class CacheEntry:
+    __slots__ = ("key", "path", "size", "data")
+
+    def __init__(self, key, path, size, data=None):
+        self.key = key
+        self.path = path
+        self.size = size
+        # Only set when the entry was served from the in-memory hot tier
+        self.data = data
+
+
+class CacheWriter:
+    """Streams audio into a temp file and publishes it atomically on commit."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        if not self.size:
+            os.unlink(self.tmp_path)
+            return None
+        return self.cache._publish(self.key, self.tmp_path, self.size)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class AudioCache:
+    """Content-addressed on-disk audio cache with an in-memory hot tier.
+
+    Both tiers are LRU and bounded by total bytes. Disk recency is kept in the
+    file mtime so the ordering survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes, hot_max_bytes, hot_item_max_bytes=1024 * 1024, wait_shared=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_max_bytes = hot_max_bytes
+        self.hot_item_max_bytes = hot_item_max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> size, least recently used first
+        self._disk_bytes = 0
+        self._hot = OrderedDict()  # key -> bytes
+        self._hot_bytes = 0
+        self.hits = 0
+        self.hot_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.flights = SingleFlight(wait_shared)
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(text, voice_id, model):
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        digest = hashlib.sha256()
+        for part in (normalized, voice_id, model):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _load_index(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".part"):
+                    # Leftover from an interrupted write
+                    os.unlink(path)
+                elif name.endswith(".mp3"):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        logger.info(f"TTS cache loaded {len(self._index)} entries ({self._disk_bytes} bytes) from {self.directory}")
+
+    def get(self, key):
+        return self._get(key, count=True)
+
+    def _get(self, key, count):
+        with self._lock:
+            data = self._hot.get(key)
+            if data is not None:
+                self._hot.move_to_end(key)
+                self._index.move_to_end(key)
+                if count:
+                    self.hits += 1
+                    self.hot_hits += 1
+                return CacheEntry(key, self.path_for(key), len(data), data)
+            size = self._index.get(key)
+            if size is None:
+                if count:
+                    self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            if count:
+                self.hits += 1
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+            if size <= self.hot_item_max_bytes:
+                # Small prompts are promoted so repeat hits skip the disk
+                with open(path, "rb") as f:
+                    data = f.read()
+                with self._lock:
+                    self._promote(key, data)
+                return CacheEntry(key, path, size, data)
+        except FileNotFoundError:
+            with self._lock:
+                self._drop(key)
+            return None
+        return CacheEntry(key, path, size)
+
+    def get_or_create(self, key, fn):
+        """Returns the cached entry, or caches the audio returned by fn(); concurrent misses share one call."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        def create():
+            # A previous flight may have filled the cache between our lookup and becoming leader
+            entry = self._get(key, count=False)
+            if entry is None:
+                data = fn()
+                entry = self.put(key, data) if data else None
+            return entry
+
+        entry, shared = self.flights.do(key, create)
+        if shared:
+            self.record_coalesced()
+        return entry
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def put(self, key, data):
+        writer = self.writer(key)
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        entry = writer.commit()
+        if entry is not None and len(data) <= self.hot_item_max_bytes:
+            with self._lock:
+                self._promote(key, data)
+            entry.data = data
+        return entry
+
+    def writer(self, key):
+        return CacheWriter(self, key)
+
+    def _publish(self, key, tmp_path, size):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._disk_bytes -= previous
+            self._index[key] = size
+            self._disk_bytes += size
+            self._evict_disk()
+        return CacheEntry(key, path, size)
+
+    def _promote(self, key, data):
+        # A concurrent put may have evicted the key since it was read or written; don't resurrect it
+        if key not in self._index:
+            return
+        previous = self._hot.pop(key, None)
+        if previous is not None:
+            self._hot_bytes -= len(previous)
+        self._hot[key] = data
+        self._hot_bytes += len(data)
+        while self._hot_bytes > self.hot_max_bytes and self._hot:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_bytes -= len(evicted)
+
+    def _drop(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        data = self._hot.pop(key, None)
+        if data is not None:
+            self._hot_bytes -= len(data)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_bytes and len(self._index) > 1:
+            key = next(iter(self._index))
+            self._drop(key)
+            self.evictions += 1
+            try:
+                os.unlink(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes,
+                "hot_entries": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "hits": self.hits,
+                "hot_hits": self.hot_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
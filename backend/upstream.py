@@ -0,0 +1,143 @@
+"""Shared, pooled HTTP clients for the upstream providers.
+
+One client per provider keeps connections alive across requests and bounds
+the connections opened to each host. Every client has explicit timeouts.
+"""
+import logging
+import os
+
+import httpx
+
+import metrics
+from scheduler import capped_timeout, remaining
+
+logger = logging.getLogger("Nexus Voice AI")
+
+PROVIDERS = ('deepgram', 'elevenlabs', 'openai', 'n8n')
+
+DEEPGRAM_API_URL = os.getenv("DEEPGRAM_API_URL", "https://api.deepgram.com/v1/listen")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+# Unset keeps the OpenAI SDK default
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+UPSTREAM_TIMEOUT = httpx.Timeout(
+    float(os.getenv("UPSTREAM_READ_TIMEOUT", 60)),
+    connect=float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 5)),
+    pool=float(os.getenv("UPSTREAM_POOL_TIMEOUT", 10))
+)
+UPSTREAM_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 200)),
+    max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 50)),
+    keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30))
+)
+
+_clients = {}
+_async_clients = {}
+
+
+def http_client(provider):
+    client = _clients.get(provider)
+    if client is None:
+        client = _clients[provider] = httpx.Client(
+            timeout=UPSTREAM_TIMEOUT, limits=UPSTREAM_LIMITS, event_hooks=metrics.http_event_hooks(provider)
+        )
+    return client
+
+
+def async_http_client(provider):
+    # Async clients are bound to the event loop that first uses them; the ASGI app runs a single loop
+    client = _async_clients.get(provider)
+    if client is None:
+        client = _async_clients[provider] = httpx.AsyncClient(
+            timeout=UPSTREAM_TIMEOUT, limits=UPSTREAM_LIMITS, event_hooks=metrics.async_http_event_hooks(provider)
+        )
+    return client
+
+
+def request_timeout():
+    """UPSTREAM_TIMEOUT with each phase capped by the time left before the request deadline."""
+    if remaining() is None:
+        return UPSTREAM_TIMEOUT
+    return httpx.Timeout(
+        capped_timeout(UPSTREAM_TIMEOUT.read),
+        connect=capped_timeout(UPSTREAM_TIMEOUT.connect),
+        write=capped_timeout(UPSTREAM_TIMEOUT.write),
+        pool=capped_timeout(UPSTREAM_TIMEOUT.pool)
+    )
+
+
+def elevenlabs_request_options():
+    """ElevenLabs SDK request options: none by default, a timeout capped by the deadline when there is one."""
+    if remaining() is None:
+        return None
+    return {'timeout_in_seconds': capped_timeout(UPSTREAM_TIMEOUT.read)}
+
+
+def _pool_stats(client):
+    # httpx doesn't expose its pool; this reads httpcore's connection list when the default transport is used
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = getattr(pool, 'connections', None)
+    if connections is None:
+        return None
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {'open': len(connections), 'idle': idle, 'active': len(connections) - idle}
+
+
+def pool_stats():
+    """Connection counts of each pooled client, for the health check."""
+    stats = {f"{provider}": _pool_stats(client) for provider, client in _clients.items()}
+    stats.update({f"{provider}_async": _pool_stats(client) for provider, client in _async_clients.items()})
+    stats['max_connections'] = UPSTREAM_LIMITS.max_connections
+    return stats
+
+
+async def aclose_async_clients():
+    for client in _async_clients.values():
+        await client.aclose()
+    _async_clients.clear()
+
+
+def close_clients():
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+
+# ---------------- Deepgram ----------------
+def _deepgram_request(api_key, mimetype, language):
+    params = {
+        "punctuate": "true",
+        "language": language,
+        "model": "nova-2",
+        "smart_format": "true",
+        "diarize": "true"
+    }
+    headers = {"Authorization": f"Token {api_key}", "Content-Type": mimetype}
+    return params, headers
+
+
+def parse_alternative(response):
+    """Returns the best alternative (transcript, confidence, words) of a Deepgram response, or None."""
+    if "results" in response and "channels" in response["results"]:
+        return response["results"]["channels"][0]["alternatives"][0]
+
+    logger.error(f"Transcription response format is incorrect: {response}")
+    return None
+
+
+def transcribe(api_key, audio_data, language, mimetype):
+    params, headers = _deepgram_request(api_key, mimetype, language)
+    response = http_client('deepgram').post(
+        DEEPGRAM_API_URL, params=params, headers=headers, content=audio_data, timeout=request_timeout()
+    )
+    response.raise_for_status()
+    return parse_alternative(response.json())
+
+
+async def transcribe_async(api_key, audio_data, language, mimetype):
+    params, headers = _deepgram_request(api_key, mimetype, language)
+    response = await async_http_client('deepgram').post(
+        DEEPGRAM_API_URL, params=params, headers=headers, content=audio_data, timeout=request_timeout()
+    )
+    response.raise_for_status()
+    return parse_alternative(response.json())
@@ -1,8 +1,34 @@
-import React, { useState, useCallback } from 'react';
+import React, { useState, useCallback, useRef, useEffect } from 'react';
 import { useLanguage } from '../context/LanguageContext';
 import { FaFileUpload, FaDownload, FaTrash, FaChartBar, FaLanguage, FaMagic, FaHistory, FaServer } from 'react-icons/fa';
 import VirtualizedList from './VirtualizedList';
 
+// Parses a text/event-stream body and calls onEvent(event, data) for each message
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      message.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 const TextProcessing = () => {
   const { currentLanguage, translations } = useLanguage();
   const [text, setText] = useState('');
@@ -10,6 +36,10 @@ const TextProcessing = () => {
   const [analysis, setAnalysis] = useState(null);
   const [history, setHistory] = useState([]);
   const [processingType, setProcessingType] = useState('summarize');
+  const abortRef = useRef(null);
+
+  // Abort an in-flight stream on unmount so the backend stops generating
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   const processingOptions = [
     { id: 'summarize', name: 'Summarize', icon: <FaChartBar /> },
@@ -36,11 +66,16 @@ const TextProcessing = () => {
   const processText = useCallback(async () => {
     if (!text) return;
 
+    abortRef.current?.abort();
+    const controller = new AbortController();
+    abortRef.current = controller;
+
+    setProcessedText('');
     setAnalysis({ status: 'processing' });
     const startTime = Date.now();
 
     try {
-      const response = await fetch('http://localhost:5000/api/process', {
+      const response = await fetch('http://localhost:5000/api/process?stream=1', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -50,13 +85,27 @@ const TextProcessing = () => {
           language: currentLanguage,
           type: processingType,
         }),
+        signal: controller.signal,
       });
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const result = await response.json();
+      let result = null;
+      await readEventStream(response, (event, data) => {
+        if (event === 'token') {
+          setProcessedText(prev => prev + data.text);
+        } else if (event === 'done') {
+          result = data;
+        } else if (event === 'error') {
+          throw new Error(data.error);
+        }
+      });
+
+      if (!result) {
+        throw new Error('Stream ended before processing completed');
+      }
       const endTime = Date.now();
 
       const analysisResult = {
@@ -83,11 +132,23 @@ const TextProcessing = () => {
       }, ...prev]);
 
     } catch (error) {
+      if (error.name === 'AbortError') {
+        setAnalysis({ status: 'cancelled' });
+        return;
+      }
       console.error("Error processing text:", error);
       setAnalysis({ status: 'error', message: error.message });
+    } finally {
+      if (abortRef.current === controller) {
+        abortRef.current = null;
+      }
     }
   }, [text, currentLanguage, processingType]);
 
+  const handleStop = useCallback(() => {
+    abortRef.current?.abort();
+  }, []);
+
   const handleDownload = useCallback((item) => {
     const content = `Original Text:\n${item.originalText}\n\nProcessed Text:\n${item.processedText}\n\nMetrics:\nWord Count: ${item.metrics.wordCount}\nCharacter Count: ${item.metrics.charCount}\nSentence Count: ${item.metrics.sentenceCount}\nProcessing Time: ${item.metrics.processingTime}ms`;
     
@@ -198,14 +259,14 @@ const TextProcessing = () => {
         />
         <button
           className="process-button"
-          onClick={processText}
-          disabled={!text || analysis?.status === 'processing'}
+          onClick={analysis?.status === 'processing' ? handleStop : processText}
+          disabled={!text}
         >
-          {analysis?.status === 'processing' ? 'Processing...' : 'Process Text'}
+          {analysis?.status === 'processing' ? 'Stop' : 'Process Text'}
         </button>
       </div>
 
-      {analysis && analysis.status !== 'processing' && (
+      {analysis && (analysis.status !== 'processing' || processedText) && (
         <div className="analysis-panel">
           <div className="processed-text">
             <h3>Processed Result</h3>